@@ -8,7 +8,7 @@
 import pygame
 from constants import *
 from menu import Menu
-from game_logic import GameState, set_move_functions
+from game_logic import GameState
 import sys
 
 pygame.init()
@@ -19,11 +19,7 @@ menu = Menu()
 current_mode = None
 online_client = None
 
-# Set move functions in game_logic to avoid circular imports
-def _setup_game_logic():
-    set_move_functions(check_options, check_ep)
-
-# Make these accessible for move checking functions
+# Module-level views of game_state used by the drawing and input code
 white_pieces = game_state.white_pieces
 white_locations = game_state.white_locations
 black_pieces = game_state.black_pieces
@@ -79,11 +75,6 @@ def sync_globals():
     white_options = game_state.white_options
     black_options = game_state.black_options
     selected_piece = game_state.selected_piece
-    
-    # Update game_state options after syncing globals (needed for move checking)
-    game_state._update_options()
-    white_options = game_state.white_options
-    black_options = game_state.black_options
 
 # draw main game board
 def draw_board():
@@ -150,217 +141,6 @@ def draw_pieces():
                                                   100, 100], 2)
 
 
-# function to check all pieces valid options on board
-def check_options(pieces, locations, turn):
-    global castling_moves
-    moves_list = []
-    all_moves_list = []
-    castling_moves = []
-    for i in range((len(pieces))):
-        location = locations[i]
-        piece = pieces[i]
-        if piece == 'pawn':
-            moves_list = check_pawn(location, turn)
-        elif piece == 'rook':
-            moves_list = check_rook(location, turn)
-        elif piece == 'knight':
-            moves_list = check_knight(location, turn)
-        elif piece == 'bishop':
-            moves_list = check_bishop(location, turn)
-        elif piece == 'queen':
-            moves_list = check_queen(location, turn)
-        elif piece == 'king':
-            moves_list, castling_moves = check_king(location, turn)
-        all_moves_list.append(moves_list)
-    return all_moves_list
-
-
-# check king valid moves
-def check_king(position, color):
-    moves_list = []
-    castle_moves = check_castling()
-    if color == 'white':
-        enemies_list = black_locations
-        friends_list = white_locations
-    else:
-        friends_list = black_locations
-        enemies_list = white_locations
-    # 8 squares to check for kings, they can go one square any direction
-    targets = [(1, 0), (1, 1), (1, -1), (-1, 0), (-1, 1), (-1, -1), (0, 1), (0, -1)]
-    for i in range(8):
-        target = (position[0] + targets[i][0], position[1] + targets[i][1])
-        if target not in friends_list and 0 <= target[0] <= 7 and 0 <= target[1] <= 7:
-            moves_list.append(target)
-    return moves_list, castle_moves
-
-
-# check queen valid moves
-def check_queen(position, color):
-    moves_list = check_bishop(position, color)
-    second_list = check_rook(position, color)
-    for i in range(len(second_list)):
-        moves_list.append(second_list[i])
-    return moves_list
-
-
-# check bishop moves
-def check_bishop(position, color):
-    moves_list = []
-    if color == 'white':
-        enemies_list = black_locations
-        friends_list = white_locations
-    else:
-        friends_list = black_locations
-        enemies_list = white_locations
-    for i in range(4):  # up-right, up-left, down-right, down-left
-        path = True
-        chain = 1
-        if i == 0:
-            x = 1
-            y = -1
-        elif i == 1:
-            x = -1
-            y = -1
-        elif i == 2:
-            x = 1
-            y = 1
-        else:
-            x = -1
-            y = 1
-        while path:
-            if (position[0] + (chain * x), position[1] + (chain * y)) not in friends_list and \
-                    0 <= position[0] + (chain * x) <= 7 and 0 <= position[1] + (chain * y) <= 7:
-                moves_list.append((position[0] + (chain * x), position[1] + (chain * y)))
-                if (position[0] + (chain * x), position[1] + (chain * y)) in enemies_list:
-                    path = False
-                chain += 1
-            else:
-                path = False
-    return moves_list
-
-
-# check rook moves
-def check_rook(position, color):
-    moves_list = []
-    if color == 'white':
-        enemies_list = black_locations
-        friends_list = white_locations
-    else:
-        friends_list = black_locations
-        enemies_list = white_locations
-    for i in range(4):  # down, up, right, left
-        path = True
-        chain = 1
-        if i == 0:
-            x = 0
-            y = 1
-        elif i == 1:
-            x = 0
-            y = -1
-        elif i == 2:
-            x = 1
-            y = 0
-        else:
-            x = -1
-            y = 0
-        while path:
-            if (position[0] + (chain * x), position[1] + (chain * y)) not in friends_list and \
-                    0 <= position[0] + (chain * x) <= 7 and 0 <= position[1] + (chain * y) <= 7:
-                moves_list.append((position[0] + (chain * x), position[1] + (chain * y)))
-                if (position[0] + (chain * x), position[1] + (chain * y)) in enemies_list:
-                    path = False
-                chain += 1
-            else:
-                path = False
-    return moves_list
-
-
-# check valid pawn moves
-def check_pawn(position, color):
-    moves_list = []
-    if color == 'white':
-        # Forward move (one square) - white moves down (increasing row)
-        forward_one = (position[0], position[1] + 1)
-        if forward_one not in white_locations and forward_one not in black_locations and position[1] < 7:
-            moves_list.append(forward_one)
-            # Double move from starting position (row 1 for white)
-            if position[1] == 1:
-                forward_two = (position[0], position[1] + 2)
-                if forward_two not in white_locations and forward_two not in black_locations:
-                    moves_list.append(forward_two)
-        
-        # Diagonal captures (right) - can only capture if enemy piece is there
-        if position[0] < 7 and position[1] < 7:
-            capture_right = (position[0] + 1, position[1] + 1)
-            if capture_right in black_locations:
-                moves_list.append(capture_right)
-        
-        # Diagonal captures (left)
-        if position[0] > 0 and position[1] < 7:
-            capture_left = (position[0] - 1, position[1] + 1)
-            if capture_left in black_locations:
-                moves_list.append(capture_left)
-        
-        # En passant captures
-        if black_ep != (100, 100):
-            ep_right = (position[0] + 1, position[1] + 1)
-            ep_left = (position[0] - 1, position[1] + 1)
-            if ep_right == black_ep and position[0] < 7:
-                moves_list.append(black_ep)
-            elif ep_left == black_ep and position[0] > 0:
-                moves_list.append(black_ep)
-    else:  # black
-        # Forward move (one square) - black moves up (decreasing row)
-        forward_one = (position[0], position[1] - 1)
-        if forward_one not in white_locations and forward_one not in black_locations and position[1] > 0:
-            moves_list.append(forward_one)
-            # Double move from starting position (row 6 for black)
-            if position[1] == 6:
-                forward_two = (position[0], position[1] - 2)
-                if forward_two not in white_locations and forward_two not in black_locations:
-                    moves_list.append(forward_two)
-        
-        # Diagonal captures (right)
-        if position[0] < 7 and position[1] > 0:
-            capture_right = (position[0] + 1, position[1] - 1)
-            if capture_right in white_locations:
-                moves_list.append(capture_right)
-        
-        # Diagonal captures (left)
-        if position[0] > 0 and position[1] > 0:
-            capture_left = (position[0] - 1, position[1] - 1)
-            if capture_left in white_locations:
-                moves_list.append(capture_left)
-        
-        # En passant captures
-        if white_ep != (100, 100):
-            ep_right = (position[0] + 1, position[1] - 1)
-            ep_left = (position[0] - 1, position[1] - 1)
-            if ep_right == white_ep and position[0] < 7:
-                moves_list.append(white_ep)
-            elif ep_left == white_ep and position[0] > 0:
-                moves_list.append(white_ep)
-    return moves_list
-
-
-# check valid knight moves
-def check_knight(position, color):
-    moves_list = []
-    if color == 'white':
-        enemies_list = black_locations
-        friends_list = white_locations
-    else:
-        friends_list = black_locations
-        enemies_list = white_locations
-    # 8 squares to check for knights, they can go two squares in one direction and one in another
-    targets = [(1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1)]
-    for i in range(8):
-        target = (position[0] + targets[i][0], position[1] + targets[i][1])
-        if target not in friends_list and 0 <= target[0] <= 7 and 0 <= target[1] <= 7:
-            moves_list.append(target)
-    return moves_list
-
-
 # check for valid moves for just selected piece
 def check_valid_moves():
     if turn_step < 2:
@@ -425,80 +205,6 @@ def draw_game_over():
     screen.blit(font.render(f'Press ENTER to Restart!', True, 'white'), (210, 240))
 
 
-# check en passant because people on the internet won't stop bugging me for it
-def check_ep(old_coords, new_coords):
-    if turn_step <= 1:
-        index = white_locations.index(old_coords)
-        ep_coords = (new_coords[0], new_coords[1] - 1)
-        piece = white_pieces[index]
-    else:
-        index = black_locations.index(old_coords)
-        ep_coords = (new_coords[0], new_coords[1] + 1)
-        piece = black_pieces[index]
-    if piece == 'pawn' and abs(old_coords[1] - new_coords[1]) > 1:
-        # if piece was pawn and moved two spaces, return EP coords as defined above
-        pass
-    else:
-        ep_coords = (100, 100)
-    return ep_coords
-
-
-# add castling
-def check_castling():
-    # king must not currently be in check, neither the rook nor king has moved previously, nothing between
-    # and the king does not pass through or finish on an attacked piece
-    castle_moves = []  # store each valid castle move as [((king_coords), (castle_coords))]
-    rook_indexes = []
-    rook_locations = []
-    king_index = 0
-    king_pos = (0, 0)
-    if turn_step > 1:
-        for i in range(len(white_pieces)):
-            if white_pieces[i] == 'rook':
-                rook_indexes.append(white_moved[i])
-                rook_locations.append(white_locations[i])
-            if white_pieces[i] == 'king':
-                king_index = i
-                king_pos = white_locations[i]
-        if not white_moved[king_index] and False in rook_indexes and not check:
-            for i in range(len(rook_indexes)):
-                castle = True
-                if rook_locations[i][0] > king_pos[0]:
-                    empty_squares = [(king_pos[0] + 1, king_pos[1]), (king_pos[0] + 2, king_pos[1]),
-                                     (king_pos[0] + 3, king_pos[1])]
-                else:
-                    empty_squares = [(king_pos[0] - 1, king_pos[1]), (king_pos[0] - 2, king_pos[1])]
-                for j in range(len(empty_squares)):
-                    if empty_squares[j] in white_locations or empty_squares[j] in black_locations or \
-                            empty_squares[j] in black_options or rook_indexes[i]:
-                        castle = False
-                if castle:
-                    castle_moves.append((empty_squares[1], empty_squares[0]))
-    else:
-        for i in range(len(black_pieces)):
-            if black_pieces[i] == 'rook':
-                rook_indexes.append(black_moved[i])
-                rook_locations.append(black_locations[i])
-            if black_pieces[i] == 'king':
-                king_index = i
-                king_pos = black_locations[i]
-        if not black_moved[king_index] and False in rook_indexes and not check:
-            for i in range(len(rook_indexes)):
-                castle = True
-                if rook_locations[i][0] > king_pos[0]:
-                    empty_squares = [(king_pos[0] + 1, king_pos[1]), (king_pos[0] + 2, king_pos[1]),
-                                     (king_pos[0] + 3, king_pos[1])]
-                else:
-                    empty_squares = [(king_pos[0] - 1, king_pos[1]), (king_pos[0] - 2, king_pos[1])]
-                for j in range(len(empty_squares)):
-                    if empty_squares[j] in white_locations or empty_squares[j] in black_locations or \
-                            empty_squares[j] in white_options or rook_indexes[i]:
-                        castle = False
-                if castle:
-                    castle_moves.append((empty_squares[1], empty_squares[0]))
-    return castle_moves
-
-
 def draw_castling(moves):
     if turn_step < 2:
         color = 'red'
@@ -577,9 +283,6 @@ def reset_game():
     sync_globals()
 
 
-# Setup game logic functions
-_setup_game_logic()
-
 # main game loop
 counter = 0
 run = True
@@ -1,320 +1,924 @@
 # AI engine for chess game
-# Supports both Minimax and Stockfish
+# Supports both Minimax and Stockfish, with an optional Polyglot opening book
+# Both AIs can also be driven from asyncio (get_move_async) or through futures
+# (get_move_future), so one process can serve many games without a thread each.
 
+import asyncio
+import concurrent.futures
 import random
 import copy
-from constants import *
+import time
+import queue
+import mmap
+import struct
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+import movegen
+from bitbases import Bitbases, DEFAULT_DIRECTORY as BITBASE_DIRECTORY
+from engine_pool import shared_pool, async_pool
+from bitboard import PIECE_TYPES, POS_BITS
+from evaluation import PIECE_VALUES, PawnHashTable
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from time_manager import TimeManager, DEFAULT_BASE as DEFAULT_BASE_TIME, DEFAULT_INCREMENT
+
+WIN_SCORE = 100000
+DELTA_MARGIN = 200  # quiescence: skip captures that cannot lift the score to within this of alpha
+ASPIRATION_WINDOW = 50  # first root window is the previous score +- this
+ASPIRATION_LIMIT = 1000  # widen to a full window once a re-search would exceed this
+KNOWN_WIN_SCORE = 50000  # bitbase win, below WIN_SCORE so the search keeps looking for the mate
+MAX_SEARCH_DEPTH = 64  # iterative deepening cap when only a time/node budget is given
+TIME_CHECK_INTERVAL = 256  # nodes between clock reads
+HELPER_RESULT_TIMEOUT = 2.0  # seconds to wait for a stopped SMP helper to report
+ENGINE_WAIT_TIMEOUT = 10.0  # seconds StockfishAI waits for a free pooled engine before using minimax
+ENGINE_ATTEMPTS = 2  # tries per move, each on a healthy engine
+ENGINE_MAX_DEPTH = 20  # Stockfish stops here even when the time manager would allow more
+# Selective search
+NULL_MOVE_REDUCTION = 2  # a null move is searched this many plies shallower than a real one
+NULL_MOVE_MIN_DEPTH = 3
+LMR_FULL_DEPTH_MOVES = 3  # moves searched at full depth before late move reductions start
+LMR_MIN_DEPTH = 3
+FUTILITY_MARGIN = 150  # frontier quiet moves are skipped when static eval + this cannot reach alpha
+
+# Move ordering scores: TT move, then captures by MVV-LVA, then killers, then quiet moves by history
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28
+KILLER_SCORES = (1 << 27, (1 << 27) - 1)
+HISTORY_LIMIT = 1 << 26
+# Most valuable victim first, least valuable attacker breaks ties
+MVV_LVA = {victim: {attacker: 8 * (v + 1) - a for a, attacker in enumerate(PIECE_TYPES)}
+           for v, victim in enumerate(PIECE_TYPES)}
+# Move generation stages, see MinimaxAI._staged_moves
+STAGE_TT, STAGE_CAPTURES, STAGE_KILLERS, STAGE_QUIETS = range(4)
+
+
+def _score_to_tt(score, ply):
+    """King-capture scores count plies from the root; the table stores them from the node"""
+    if score >= WIN_SCORE - MAX_SEARCH_DEPTH:
+        return score + ply
+    if score <= -WIN_SCORE + MAX_SEARCH_DEPTH:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score >= WIN_SCORE - MAX_SEARCH_DEPTH:
+        return score - ply
+    if score <= -WIN_SCORE + MAX_SEARCH_DEPTH:
+        return score + ply
+    return score
+
+
+class SearchAborted(Exception):
+    """Raised inside the search when the time or node budget runs out"""
+
+
+class OpeningBook:
+    """Polyglot opening book (.bin) read through mmap.
+    
+    The file is an array of 16-byte big-endian entries (key, move, weight, learn)
+    sorted by key, so all moves of a position are found with one binary search.
+    Position keys are the Polyglot Zobrist hashes computed by python-chess.
+    """
+    ENTRY = struct.Struct('>QHHI')
+    PROMOTIONS = {1: 'knight', 2: 'bishop', 3: 'rook', 4: 'queen'}
+    
+    def __init__(self, path, max_depth=20, weighted=True, rng=None):
+        """max_depth is the last ply (half-move) the book is used for; weighted picks
+        moves at random in proportion to their weight instead of always the heaviest"""
+        import chess.polyglot  # fail early when python-chess is missing
+        
+        self.path = path
+        self.max_depth = max_depth
+        self.weighted = weighted
+        self.rng = rng or random.Random()
+        with open(path, 'rb') as book_file:
+            # mmap cannot map an empty file
+            self._mmap = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ) if book_file.seek(0, 2) else b''
+        self.entry_count = len(self._mmap) // self.ENTRY.size
+    
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._mmap = b''
+        self.entry_count = 0
+    
+    def _key_at(self, index):
+        return self.ENTRY.unpack_from(self._mmap, index * self.ENTRY.size)[0]
+    
+    def entries(self, key):
+        """Return the (polyglot_move, weight) pairs stored for a position key"""
+        low, high = 0, self.entry_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        for index in range(low, self.entry_count):
+            entry_key, move, weight, _ = self.ENTRY.unpack_from(self._mmap, index * self.ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((move, weight))
+        return found
+    
+    @staticmethod
+    def position_key(game_state):
+        import chess
+        import chess.polyglot
+        
+        return chess.polyglot.zobrist_hash(chess.Board(game_state.get_fen()))
+    
+    def _decode(self, code, game_state):
+        """Convert a Polyglot move to a (from_pos, to_pos[, promotion]) move.
+        
+        Columns run h-a on this board, so file f is column 7 - f. Polyglot writes
+        castling as the king capturing its own rook.
+        """
+        from_pos = (7 - (code >> 6 & 7), code >> 9 & 7)
+        to_pos = (7 - (code & 7), code >> 3 & 7)
+        promotion = self.PROMOTIONS.get(code >> 12 & 7)
+        if from_pos == (3, from_pos[1]) and to_pos[1] == from_pos[1] and to_pos[0] in (0, 7) \
+                and game_state.board.piece_at(from_pos) == ('white' if from_pos[1] == 0 else 'black', 'king'):
+            to_pos = (1 if to_pos[0] == 0 else 5, from_pos[1])
+        return (from_pos, to_pos, promotion) if promotion else (from_pos, to_pos)
+    
+    def pick(self, game_state):
+        """Return a book move for the side to move, or None when out of book"""
+        if not self.entry_count or game_state.ply >= self.max_depth:
+            return None
+        candidates = self.entries(self.position_key(game_state))
+        if not candidates:
+            return None
+        legal = set(movegen.legal_moves(copy.deepcopy(game_state)))
+        moves, weights = [], []
+        for code, weight in candidates:
+            move = self._decode(code, game_state)
+            if move in legal and weight:
+                moves.append(move)
+                weights.append(weight)
+        if not moves:
+            return None
+        if self.weighted:
+            return self.rng.choices(moves, weights)[0]
+        return moves[weights.index(max(weights))]
+
+
+def load_book(path, max_depth=20, weighted=True):
+    """Open a Polyglot book, or return None (with a message) when it cannot be used"""
+    if not path:
+        return None
+    try:
+        return OpeningBook(path, max_depth, weighted)
+    except ImportError:
+        print("python-chess not installed, opening book disabled. Install with: pip install python-chess")
+    except OSError as e:
+        print(f"Could not open opening book {path}: {e}")
+    return None
+
+
+def _smp_helper(settings, shm_name, generation, state, start_depth, stop_event, results):
+    """Lazy SMP helper process: search the same root into the shared transposition table"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        ai = MinimaxAI(tt_buffer=shm.buf, **settings)
+        ai.tt.generation = generation
+        ai._stop_event = stop_event
+        move = ai._iterative_deepening(state, start_depth)
+        results.put((ai.completed_depth, move, ai.nodes, ai.score, ai.principal_variation))
+        ai = None
+    finally:
+        shm.close()
+
+
+_executor = None  # thread pool running MinimaxAI searches for get_move_future
+_loop = None  # event loop thread running StockfishAI.get_move_future
+_background_lock = threading.Lock()
+
+
+def _search_executor():
+    global _executor
+    with _background_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix='ai-search')
+        return _executor
+
+
+def _background_loop():
+    """Event loop on a daemon thread, for future callers that run no loop themselves"""
+    global _loop
+    with _background_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='ai-event-loop', daemon=True).start()
+        return _loop
+
+
+def _cancellable_future(executor, cancel_event, function, *args):
+    """Run function on executor; cancelling the returned future sets cancel_event.
+    
+    concurrent.futures cannot cancel a job that has started, so the job is expected
+    to watch cancel_event; its result is discarded once the future is cancelled.
+    """
+    future = concurrent.futures.Future()
+    job = executor.submit(function, *args)
+    
+    def on_cancel(future):
+        if future.cancelled():
+            cancel_event.set()
+            job.cancel()
+    
+    def on_done(job):
+        if future.cancelled() or job.cancelled():
+            return
+        try:
+            if job.exception() is not None:
+                future.set_exception(job.exception())
+            else:
+                future.set_result(job.result())
+        except concurrent.futures.InvalidStateError:
+            pass  # cancelled in the meantime
+    
+    future.add_done_callback(on_cancel)
+    job.add_done_callback(on_done)
+    return future
+
 
 class MinimaxAI:
-    def __init__(self, depth=3):
+    def __init__(self, depth=3, tt_size_mb=16, time_limit=None, node_limit=None, pawn_hash_entries=1 << 14,
+                 workers=1, tt_buffer=None, book_path=None, book_max_depth=20, bitbase_dir=BITBASE_DIRECTORY,
+                 null_move=True, late_move_reductions=True, futility_pruning=True, ponder=False):
+        """depth caps the iterative deepening (None for no cap); time_limit (seconds)
+        and node_limit stop it early, e.g. MinimaxAI(depth=None, time_limit=1.0).
+        workers > 1 adds helper processes that share the transposition table (lazy SMP).
+        book_path names a Polyglot book played from for the first book_max_depth plies.
+        Endgame bitbases generated by bitbases.py are loaded from bitbase_dir if present.
+        null_move, late_move_reductions and futility_pruning switch the selective search
+        techniques on or off. With ponder the AI keeps searching the expected reply in a
+        background thread while the opponent thinks."""
+        self.book = load_book(book_path, book_max_depth)
+        self.bitbases = Bitbases(bitbase_dir) if bitbase_dir else None
+        self.bitbase_dir = bitbase_dir
         self.depth = depth
-        # Improved piece values (standard chess values)
-        self.piece_values = {
-            'pawn': 100,
-            'knight': 320,
-            'bishop': 330,
-            'rook': 500,
-            'queen': 900,
-            'king': 20000
-        }
-        
-        # Piece-square tables for positional evaluation
-        self.pawn_table = [
-            [0,  0,  0,  0,  0,  0,  0,  0],
-            [50, 50, 50, 50, 50, 50, 50, 50],
-            [10, 10, 20, 30, 30, 20, 10, 10],
-            [5,  5, 10, 25, 25, 10,  5,  5],
-            [0,  0,  0, 20, 20,  0,  0,  0],
-            [5, -5,-10,  0,  0,-10, -5,  5],
-            [5, 10, 10,-20,-20, 10, 10,  5],
-            [0,  0,  0,  0,  0,  0,  0,  0]
-        ]
-        
-        self.knight_table = [
-            [-50,-40,-30,-30,-30,-30,-40,-50],
-            [-40,-20,  0,  0,  0,  0,-20,-40],
-            [-30,  0, 10, 15, 15, 10,  0,-30],
-            [-30,  5, 15, 20, 20, 15,  5,-30],
-            [-30,  0, 15, 20, 20, 15,  0,-30],
-            [-30,  5, 10, 15, 15, 10,  5,-30],
-            [-40,-20,  0,  5,  5,  0,-20,-40],
-            [-50,-40,-30,-30,-30,-30,-40,-50]
-        ]
-        
-        self.bishop_table = [
-            [-20,-10,-10,-10,-10,-10,-10,-20],
-            [-10,  0,  0,  0,  0,  0,  0,-10],
-            [-10,  0,  5, 10, 10,  5,  0,-10],
-            [-10,  5,  5, 10, 10,  5,  5,-10],
-            [-10,  0, 10, 10, 10, 10,  0,-10],
-            [-10, 10, 10, 10, 10, 10, 10,-10],
-            [-10,  5,  0,  0,  0,  0,  5,-10],
-            [-20,-10,-10,-10,-10,-10,-10,-20]
-        ]
-        
-        self.rook_table = [
-            [0,  0,  0,  0,  0,  0,  0,  0],
-            [5, 10, 10, 10, 10, 10, 10,  5],
-            [-5,  0,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0,  0, -5],
-            [0,  0,  0,  5,  5,  0,  0,  0]
-        ]
-        
-        self.queen_table = [
-            [-20,-10,-10, -5, -5,-10,-10,-20],
-            [-10,  0,  0,  0,  0,  0,  0,-10],
-            [-10,  0,  5,  5,  5,  5,  0,-10],
-            [-5,  0,  5,  5,  5,  5,  0, -5],
-            [0,  0,  5,  5,  5,  5,  0, -5],
-            [-10,  5,  5,  5,  5,  5,  0,-10],
-            [-10,  0,  5,  0,  0,  0,  0,-10],
-            [-20,-10,-10, -5, -5,-10,-10,-20]
-        ]
-        
-        self.king_table = [
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-20,-30,-30,-40,-40,-30,-30,-20],
-            [-10,-20,-20,-20,-20,-20,-20,-10],
-            [20, 20,  0,  0,  0,  0, 20, 20],
-            [20, 30, 10,  0,  0, 10, 30, 20]
-        ]
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.pawn_hash_entries = pawn_hash_entries
+        self.workers = max(1, workers)
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
+        self.futility_pruning = futility_pruning
+        self.ponder = ponder
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        self._ponder_thread = None
+        self._ponder_key = None
+        self._ponder_move = None
+        self._ponder_start = None
+        self.nodes = 0
+        self.q_nodes = 0
+        self.see_pruned = 0
+        self.delta_pruned = 0
+        self.aspiration_researches = 0
+        self.null_cutoffs = 0
+        self.lmr_reductions = 0
+        self.lmr_researches = 0
+        self.futility_pruned = 0
+        self.completed_depth = 0
+        self.score = None  # of the last completed iteration, from the AI's (black's) point of view
+        self.principal_variation = []
+        self._deadline = None
+        self._stop_event = None
+        self._cancel_event = None  # set when the caller of get_move_future cancels it
+        # Triangular PV table: row ply holds the best line found from ply onwards
+        self.pv_table = [[None] * (MAX_SEARCH_DEPTH + 1) for _ in range(MAX_SEARCH_DEPTH + 1)]
+        self.pv_length = [0] * (MAX_SEARCH_DEPTH + 1)
+        # Quiet moves that caused a beta cutoff: two per ply, and a from/to history per color
+        self.killers = [[None, None] for _ in range(MAX_SEARCH_DEPTH)]
+        self.history = {'white': [0] * 4096, 'black': [0] * 4096}
+        # Positions reached through different move orders share one search result
+        self._shared_memory = None
+        if tt_buffer is None and self.workers > 1:
+            self._shared_memory = shared_memory.SharedMemory(create=True, size=int(tt_size_mb * 1024 * 1024))
+            tt_buffer = self._shared_memory.buf
+        self.tt = TranspositionTable(tt_size_mb, buffer=tt_buffer)
+        # Pawn structure only changes when a pawn moves, so its score is cached by pawn key
+        self.pawn_hash = PawnHashTable(pawn_hash_entries)
+        # Material values and piece-square tables live in evaluation.py
+        self.piece_values = PIECE_VALUES
     
-    def get_move(self, game_state):
-        """Get the best move using minimax algorithm"""
+    def get_move(self, game_state, with_pv=False):
+        """Get the best move using iterative deepening principal variation search.
+        
+        With with_pv the result is (move, score, principal_variation) instead, the
+        score from black's point of view (None for a book move).
+        """
         if game_state.turn_step >= 2:  # Black's turn
-            best_move = self._minimax(game_state, self.depth, True, float('-inf'), float('inf'))
-            if best_move:
-                return best_move[1]
+            move = self._finish_pondering(game_state)
+            if move is None:
+                book_move = self.book.pick(game_state) if self.book else None
+                if book_move:
+                    return (book_move[:2], None, [book_move[:2]]) if with_pv else book_move[:2]
+                # Search a private copy so push/pop never disturbs the caller's state
+                state = copy.deepcopy(game_state)
+                self.tt.new_search()
+                if self.workers > 1:
+                    move = self._parallel_search(state)
+                else:
+                    move = self._iterative_deepening(state)
+            result = (move, self.score, list(self.principal_variation)) if with_pv else move
+            cancelled = self._cancel_event is not None and self._cancel_event.is_set()
+            if self.ponder and move is not None and not cancelled:
+                self._start_pondering(game_state, move)
+            return result
+        return (None, None, []) if with_pv else None
+    
+    def get_move_future(self, game_state, with_pv=False, executor=None):
+        """Start get_move on executor (a shared thread pool by default); return a
+        concurrent.futures.Future. Cancelling the future stops a running search.
+        
+        The search works on a copy, so the caller may keep using game_state.
+        """
+        cancel_event = threading.Event()
+        state = copy.deepcopy(game_state)
+        return _cancellable_future(executor or _search_executor(), cancel_event,
+                                   self._cancellable_move, cancel_event, state, with_pv)
+    
+    async def get_move_async(self, game_state, with_pv=False, executor=None):
+        """Coroutine version of get_move; the search runs on executor as in get_move_future
+        and cancelling the awaiting task stops it."""
+        return await asyncio.wrap_future(self.get_move_future(game_state, with_pv, executor))
+    
+    def _cancellable_move(self, cancel_event, state, with_pv):
+        if cancel_event.is_set():
+            return (None, None, []) if with_pv else None
+        self._cancel_event = cancel_event
+        try:
+            return self.get_move(state, with_pv)
+        finally:
+            self._cancel_event = None
+    
+    def _start_pondering(self, game_state, move):
+        """Search the position after move and the expected reply in a background thread"""
+        state = copy.deepcopy(game_state)
+        state.push(move)
+        reply = self._expected_reply(state, move)
+        if state.winner or reply is None:
+            return
+        state.push(reply)
+        if state.winner:
+            return
+        self._ponder_key = state.zobrist_key
+        self._ponder_move = None
+        self._ponder_start = time.perf_counter()
+        # No deadline until the opponent's move is known; get_move sets one on a ponder hit
+        self._deadline = None
+        self._stop_event = threading.Event()
+        self.tt.new_search()
+        self._ponder_thread = threading.Thread(target=self._ponder, args=(state,), daemon=True)
+        self._ponder_thread.start()
+    
+    def _ponder(self, state):
+        self._ponder_move = self._iterative_deepening(state, pondering=True)
+    
+    def _expected_reply(self, state, move):
+        """The opponent's move from the principal variation, else from the transposition table"""
+        variation = self.principal_variation
+        if len(variation) >= 2 and variation[0] == move:
+            return variation[1]
+        entry = self.tt.probe(state.zobrist_key)
+        if entry and entry[1]:
+            color = 'white' if state.turn_step < 2 else 'black'
+            reply = entry[1][:2]
+            if self._is_pseudo_legal(state, reply, color):
+                return reply
         return None
     
-    def _minimax(self, state, depth, maximizing, alpha, beta):
-        """Minimax algorithm with alpha-beta pruning and move ordering"""
-        if depth == 0 or state.game_over:
-            return (self._evaluate(state), None)
+    def _finish_pondering(self, game_state):
+        """On a ponder hit let the background search finish and return its move, else stop it.
         
-        if maximizing:  # Black's turn (AI)
-            max_eval = float('-inf')
-            best_move = None
-            moves = self._get_all_moves(state, 'black')
-            
-            # Move ordering: prioritize captures and checks
-            moves = self._order_moves(state, moves, 'black')
-            
-            for move in moves:
-                new_state = self._make_test_move(state, move, 'black')
-                if new_state:
-                    # Quiescence search for captures at leaf nodes
-                    if depth == 1:
-                        eval_score = self._quiescence(new_state, alpha, beta, False)
-                    else:
-                        eval_score = self._minimax(new_state, depth - 1, False, alpha, beta)[0]
-                    
-                    if eval_score > max_eval:
-                        max_eval = eval_score
-                        best_move = move
-                    alpha = max(alpha, eval_score)
-                    if beta <= alpha:
-                        break  # Alpha-beta pruning
-            return (max_eval, best_move)
-        else:  # White's turn (opponent)
-            min_eval = float('inf')
-            best_move = None
-            moves = self._get_all_moves(state, 'white')
-            
-            # Move ordering
-            moves = self._order_moves(state, moves, 'white')
+        After a hit the search may use what is left of time_limit since pondering began.
+        """
+        if self._ponder_thread is None:
+            return None
+        if game_state.zobrist_key != self._ponder_key:
+            self.ponder_misses += 1
+            self.stop_pondering()
+            return None
+        self.ponder_hits += 1
+        if self.time_limit:
+            elapsed = time.perf_counter() - self._ponder_start
+            self._deadline = time.perf_counter() + max(0.0, self.time_limit - elapsed)
+        self._ponder_thread.join()
+        self._ponder_thread = None
+        self._stop_event = None
+        return self._ponder_move
+    
+    def stop_pondering(self):
+        """Abandon the background search, e.g. when the game is over"""
+        if self._ponder_thread is not None:
+            self._stop_event.set()
+            self._ponder_thread.join()
+            self._ponder_thread = None
+            self._stop_event = None
+    
+    def _parallel_search(self, state):
+        """Lazy SMP: helpers search the same root and share the transposition table.
+        
+        Odd helpers start one iteration deeper so the processes spread over different
+        depths. This process searches as usual and stops the helpers when it is done;
+        the move of the deepest completed iteration across all processes is played.
+        """
+        context = multiprocessing.get_context()
+        stop_event = context.Event()
+        results = context.Queue()
+        settings = {'depth': self.depth, 'time_limit': self.time_limit, 'node_limit': self.node_limit,
+                    'pawn_hash_entries': self.pawn_hash_entries, 'bitbase_dir': self.bitbase_dir,
+                    'null_move': self.null_move, 'late_move_reductions': self.late_move_reductions,
+                    'futility_pruning': self.futility_pruning}
+        helpers = [context.Process(target=_smp_helper, daemon=True,
+                                   args=(settings, self._shared_memory.name, self.tt.generation, state,
+                                         1 + i % 2, stop_event, results))
+                   for i in range(1, self.workers)]
+        for helper in helpers:
+            helper.start()
+        try:
+            best_move = self._iterative_deepening(state)
+        finally:
+            stop_event.set()
+        best_depth = self.completed_depth
+        for _ in helpers:
+            try:
+                depth, move, nodes, score, variation = results.get(timeout=HELPER_RESULT_TIMEOUT)
+            except queue.Empty:
+                break
+            self.nodes += nodes
+            if move is not None and depth > best_depth:
+                best_depth, best_move = depth, move
+                self.score, self.principal_variation = score, variation
+        for helper in helpers:
+            helper.join(timeout=HELPER_RESULT_TIMEOUT)
+            if helper.is_alive():
+                helper.terminate()
+        self.completed_depth = best_depth
+        return best_move
+    
+    def close(self):
+        """Stop pondering and release the shared transposition table of a multi-worker search"""
+        self.stop_pondering()
+        if self._shared_memory is not None:
+            self.tt = None
+            self._shared_memory.close()
+            self._shared_memory.unlink()
+            self._shared_memory = None
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+    
+    def _iterative_deepening(self, state, start_depth=1, pondering=False):
+        """Search depth 1, 2, ... until the depth cap or the budget is reached.
+        
+        Each completed iteration leaves its best moves in the transposition table,
+        so the next iteration searches them first. An aborted iteration is thrown
+        away and the best move of the last completed one is returned. When pondering
+        the deadline is left to the caller.
+        """
+        self.pawn_hash.reset_stats()
+        self._age_heuristics()
+        self.nodes = 0
+        self.q_nodes = self.see_pruned = self.delta_pruned = 0
+        self.aspiration_researches = 0
+        self.null_cutoffs = self.lmr_reductions = self.lmr_researches = self.futility_pruned = 0
+        self.completed_depth = 0
+        self.score = None
+        self.principal_variation = []
+        self._root_move = None
+        if not pondering:
+            self._deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+        max_depth = self.depth or MAX_SEARCH_DEPTH
+        best_move = None
+        for depth in range(min(start_depth, max_depth), max_depth + 1):
+            try:
+                score = self._aspiration_search(state, depth, self.score)
+            except SearchAborted:
+                # Nothing completed yet: settle for the best root move seen so far
+                return best_move or self._root_move
+            if not self.pv_length[0]:
+                break
+            self.principal_variation = self.pv_table[0][:self.pv_length[0]]
+            best_move = self.principal_variation[0]
+            self.score = score
+            self.completed_depth = depth
+            if abs(score) >= WIN_SCORE - MAX_SEARCH_DEPTH:
+                break  # forced result found, deeper search cannot change it
+        return best_move
+    
+    def _aspiration_search(self, state, depth, previous_score):
+        """Search the root in a window around the previous iteration's score.
+        
+        A result outside the window is only a bound, so the failing side of the window
+        is widened and the root searched again until the score falls inside.
+        """
+        if previous_score is None or abs(previous_score) >= KNOWN_WIN_SCORE:
+            return self._negamax(state, depth, float('-inf'), float('inf'))
+        delta = ASPIRATION_WINDOW
+        alpha, beta = previous_score - delta, previous_score + delta
+        while True:
+            score = self._negamax(state, depth, alpha, beta)
+            if alpha < score < beta:
+                return score
+            self.aspiration_researches += 1
+            delta *= 4
+            if score <= alpha:
+                alpha = score - delta if delta < ASPIRATION_LIMIT else float('-inf')
+            else:
+                beta = score + delta if delta < ASPIRATION_LIMIT else float('inf')
+    
+    def _age_heuristics(self):
+        """Forget killers and halve history scores between searches"""
+        for slots in self.killers:
+            slots[0] = slots[1] = None
+        for table in self.history.values():
+            for i, value in enumerate(table):
+                if value:
+                    table[i] = value >> 1
+    
+    def _record_cutoff(self, state, move, color, depth, ply):
+        """Remember a quiet move that refuted its position"""
+        if self._is_capture(state, move, color):
+            return
+        slots = self.killers[ply]
+        if slots[0] != move:
+            slots[1] = slots[0]
+            slots[0] = move
+        table = self.history[color]
+        index = (move[0][1] * 8 + move[0][0]) * 64 + move[1][1] * 8 + move[1][0]
+        table[index] += depth * depth
+        if table[index] > HISTORY_LIMIT:
+            for i, value in enumerate(table):
+                table[i] = value >> 1
+    
+    def _is_capture(self, state, move, color):
+        from_pos, to_pos = move[0], move[1]
+        enemy = 'white' if color == 'black' else 'black'
+        if state.board.occupied[enemy] & POS_BITS[to_pos]:
+            return True
+        # en passant: a pawn moving diagonally onto an empty square
+        return from_pos[0] != to_pos[0] and state.board.pieces[color]['pawn'] & POS_BITS[from_pos] != 0
+    
+    def _count_node(self):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchAborted
+        if self.nodes % TIME_CHECK_INTERVAL == 0:
+            if self._deadline is not None and time.perf_counter() >= self._deadline:
+                raise SearchAborted
+            if self._stop_event is not None and self._stop_event.is_set():
+                raise SearchAborted
+            if self._cancel_event is not None and self._cancel_event.is_set():
+                raise SearchAborted
+    
+    def _negamax(self, state, depth, alpha, beta, ply=0, null_allowed=True):
+        """Principal variation search; scores are from the side to move's point of view.
+        
+        The first (best ordered) move is searched with the full window and the rest with
+        a null window that only has to prove them worse. A move that unexpectedly beats
+        alpha is searched again with the full window. Moves that raise alpha are copied
+        into the triangular PV table.
+        
+        Outside the principal variation the search is selective: null-move pruning,
+        futility pruning at depth 1 and reduced depth for late quiet moves.
+        """
+        self._count_node()
+        self.pv_length[ply] = ply
+        if state.winner:
+            return -WIN_SCORE + ply  # the side to move has lost its king, sooner is worse
+        if depth <= 0:
+            return self._quiescence(state, alpha, beta, ply)
+        # Bitbase draws need no search; won positions are still searched to find the mate
+        if ply > 0 and self._probe_bitbases(state) == 0:
+            return 0
+        
+        # Transposition table: reuse a deep enough bound outside the PV, otherwise try its move first
+        key = state.zobrist_key
+        alpha_orig = alpha
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry:
+            tt_score, tt_move, tt_depth, tt_flag = entry
+            tt_score = _score_from_tt(tt_score, ply)
+            if ply > 0 and tt_depth >= depth and beta - alpha == 1:
+                if tt_flag == EXACT or (tt_flag == LOWER and tt_score >= beta) \
+                        or (tt_flag == UPPER and tt_score <= alpha):
+                    return tt_score
+        
+        color = 'white' if state.turn_step < 2 else 'black'
+        in_check = movegen.in_check(state, color)
+        pv_node = beta - alpha > 1
+        static_eval = None
+        if not pv_node and not in_check and ply > 0:
+            static_eval = self._static_eval(state)
+            # Null move: if passing still fails high, a real move will too. Not tried
+            # twice in a row, nor with only king and pawns left where passing may be best.
+            if self.null_move and null_allowed and depth >= NULL_MOVE_MIN_DEPTH and static_eval >= beta \
+                    and self._has_non_pawn_material(state, color):
+                state.push_null()
+                score = -self._negamax(state, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, ply + 1, False)
+                state.pop_null()
+                if score >= beta:
+                    self.null_cutoffs += 1
+                    return beta if score >= WIN_SCORE - MAX_SEARCH_DEPTH else score
+        # Futility: at the frontier a quiet move cannot lift a hopeless static eval up to alpha
+        futile = self.futility_pruning and depth == 1 and static_eval is not None \
+            and static_eval + FUTILITY_MARGIN <= alpha and abs(alpha) < KNOWN_WIN_SCORE
+        
+        best_score = float('-inf')
+        best_move = None
+        for index, (stage, move) in enumerate(self._staged_moves(state, color, tt_move, ply)):
+            quiet = index > 0 and not in_check and (stage >= STAGE_KILLERS or self._is_quiet(state, move, color))
+            if futile and quiet:
+                self.futility_pruned += 1
+                break  # only quiet moves are left, so their stage is never generated
+            state.push(move)
+            if index == 0:
+                score = -self._negamax(state, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # Late move reductions: quiet moves ordered late are probably bad, look at them
+                # shallower first and only search them fully when they beat alpha anyway
+                reduction = 0
+                if self.late_move_reductions and quiet and stage == STAGE_QUIETS and depth >= LMR_MIN_DEPTH \
+                        and index >= LMR_FULL_DEPTH_MOVES and abs(alpha) < KNOWN_WIN_SCORE:
+                    reduction = 2 if index >= 2 * LMR_FULL_DEPTH_MOVES and depth >= 2 * LMR_MIN_DEPTH else 1
+                    self.lmr_reductions += 1
+                score = -self._negamax(state, depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                if reduction and score > alpha:
+                    self.lmr_researches += 1
+                    score = -self._negamax(state, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._negamax(state, depth - 1, -beta, -alpha, ply + 1)
+            state.pop()
             
-            for move in moves:
-                new_state = self._make_test_move(state, move, 'white')
-                if new_state:
-                    if depth == 1:
-                        eval_score = self._quiescence(new_state, alpha, beta, True)
-                    else:
-                        eval_score = self._minimax(new_state, depth - 1, True, alpha, beta)[0]
-                    
-                    if eval_score < min_eval:
-                        min_eval = eval_score
-                        best_move = move
-                    beta = min(beta, eval_score)
-                    if beta <= alpha:
-                        break  # Alpha-beta pruning
-            return (min_eval, best_move)
-    
-    def _quiescence(self, state, alpha, beta, maximizing):
-        """Quiescence search for captures"""
-        stand_pat = self._evaluate(state)
-        
-        if maximizing:
-            if stand_pat >= beta:
-                return beta
-            if alpha < stand_pat:
-                alpha = stand_pat
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if ply == 0:
+                    self._root_move = move
+            if score > alpha:
+                alpha = score
+                self._update_pv(ply, move)
+                if alpha >= beta:
+                    self._record_cutoff(state, move, color, depth, ply)
+                    break  # Alpha-beta pruning
+        
+        if best_move is None:
+            return -WIN_SCORE + ply if in_check else 0
+        if best_score <= alpha_orig:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
         else:
-            if stand_pat <= alpha:
-                return alpha
-            if beta > stand_pat:
-                beta = stand_pat
+            flag = EXACT
+        self.tt.store(key, depth, _score_to_tt(best_score, ply), flag, best_move)
+        return best_score
+    
+    def _update_pv(self, ply, move):
+        """Principal variation at ply: move followed by the child's variation"""
+        row, child = self.pv_table[ply], self.pv_table[ply + 1]
+        length = max(self.pv_length[ply + 1], ply + 1)
+        row[ply] = move
+        row[ply + 1:length] = child[ply + 1:length]
+        self.pv_length[ply] = length
+    
+    def _quiescence(self, state, alpha, beta, ply):
+        """Quiescence search over the captures that do not lose material by SEE"""
+        self._count_node()
+        self.q_nodes += 1
+        if state.winner:
+            return -WIN_SCORE + ply
+        black = state.turn_step >= 2
+        stand_pat = self._static_eval(state)
+        if stand_pat >= beta:
+            return beta
+        if alpha < stand_pat:
+            alpha = stand_pat
         
         # Only search captures
-        moves = self._get_capture_moves(state, 'black' if maximizing else 'white')
-        moves = self._order_moves(state, moves, 'black' if maximizing else 'white')
-        
-        for move in moves[:5]:  # Limit to top 5 captures
-            new_state = self._make_test_move(state, move, 'black' if maximizing else 'white')
-            if new_state:
-                score = self._quiescence(new_state, alpha, beta, not maximizing)
-                if maximizing:
-                    if score >= beta:
-                        return beta
-                    if score > alpha:
-                        alpha = score
-                else:
-                    if score <= alpha:
-                        return alpha
-                    if score < beta:
-                        beta = score
+        color = 'black' if black else 'white'
+        moves = self._order_moves(state, self._get_capture_moves(state, color), color)
+        
+        for move in moves:
+            gain = movegen.static_exchange(state, move, self.piece_values)
+            if gain < 0:
+                self.see_pruned += 1
+                continue
+            # Delta pruning: even winning the exchange cannot bring the score back up to alpha
+            if stand_pat + gain + DELTA_MARGIN <= alpha:
+                self.delta_pruned += 1
+                continue
+            state.push(move)
+            score = -self._quiescence(state, -beta, -alpha, ply + 1)
+            state.pop()
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
         
-        return alpha if maximizing else beta
+        return alpha
+    
+    def _static_eval(self, state):
+        """Evaluation from the side to move's point of view"""
+        return self._evaluate(state) if state.turn_step >= 2 else -self._evaluate(state)
+    
+    def _is_quiet(self, state, move, color):
+        """Neither a capture nor a promotion"""
+        if self._is_capture(state, move, color):
+            return False
+        return not (move[1][1] in (0, 7) and state.board.pieces[color]['pawn'] & POS_BITS[move[0]])
+    
+    def _has_non_pawn_material(self, state, color):
+        pieces = state.board.pieces[color]
+        return state.board.occupied[color] & ~(pieces['pawn'] | pieces['king']) != 0
     
     def _get_capture_moves(self, state, color):
-        """Get only capture moves"""
+        """Get only capture moves, en passant included"""
         moves = []
         if color == 'black':
             pieces = state.black_pieces
             locations = state.black_locations
             options = state.black_options
-            enemy_locations = state.white_locations
+            enemies = state.board.occupied['white']
+            enemy_ep = state.white_ep
         else:
             pieces = state.white_pieces
             locations = state.white_locations
             options = state.white_options
-            enemy_locations = state.black_locations
+            enemies = state.board.occupied['black']
+            enemy_ep = state.black_ep
         
         for i in range(len(pieces)):
             for move in options[i]:
-                if move in enemy_locations:
+                if enemies & POS_BITS[move] or (move == enemy_ep and pieces[i] == 'pawn'):
                     moves.append((locations[i], move))
         return moves
     
-    def _order_moves(self, state, moves, color):
-        """Order moves by priority (captures first, then by piece value)"""
+    def _order_moves(self, state, moves, color, tt_move=None, ply=None):
+        """Order moves: transposition table move, captures by MVV-LVA, killers, then history"""
+        board = state.board
+        enemy = 'white' if color == 'black' else 'black'
+        enemy_occupied = board.occupied[enemy]
+        pawns = board.pieces[color]['pawn']
+        killers = self.killers[ply] if ply is not None else (None, None)
+        history = self.history[color]
+        
         def move_priority(move):
-            from_pos, to_pos = move
-            priority = 0
-            
-            # Check if it's a capture
-            if color == 'black':
-                if to_pos in state.white_locations:
-                    captured_idx = state.white_locations.index(to_pos)
-                    captured_piece = state.white_pieces[captured_idx]
-                    priority += self.piece_values.get(captured_piece, 0)
-            else:
-                if to_pos in state.black_locations:
-                    captured_idx = state.black_locations.index(to_pos)
-                    captured_piece = state.black_pieces[captured_idx]
-                    priority += self.piece_values.get(captured_piece, 0)
-            
-            # Check piece value (prefer moving valuable pieces)
-            if color == 'black':
-                if from_pos in state.black_locations:
-                    piece_idx = state.black_locations.index(from_pos)
-                    piece = state.black_pieces[piece_idx]
-                    priority += self.piece_values.get(piece, 0) // 10
-            else:
-                if from_pos in state.white_locations:
-                    piece_idx = state.white_locations.index(from_pos)
-                    piece = state.white_pieces[piece_idx]
-                    priority += self.piece_values.get(piece, 0) // 10
-            
-            return priority
+            if move == tt_move:
+                return TT_MOVE_SCORE
+            from_pos, to_pos = move[0], move[1]
+            to_bit = POS_BITS[to_pos]
+            if enemy_occupied & to_bit:
+                attacker = board.piece_on(color, POS_BITS[from_pos])
+                return CAPTURE_SCORE + MVV_LVA[board.piece_on(enemy, to_bit)][attacker]
+            if from_pos[0] != to_pos[0] and pawns & POS_BITS[from_pos]:
+                return CAPTURE_SCORE + MVV_LVA['pawn']['pawn']  # en passant
+            if move == killers[0]:
+                return KILLER_SCORES[0]
+            if move == killers[1]:
+                return KILLER_SCORES[1]
+            return history[(from_pos[1] * 8 + from_pos[0]) * 64 + to_pos[1] * 8 + to_pos[0]]
         
         moves.sort(key=move_priority, reverse=True)
         return moves
     
-    def _get_all_moves(self, state, color):
-        """Get all possible moves for a color"""
-        moves = []
+    def _staged_moves(self, state, color, tt_move=None, ply=None):
+        """Yield (stage, move) for the side to move, best candidates first.
+        
+        Stages: the transposition table move, captures and promotions by MVV-LVA, the
+        killers of this ply, then the remaining quiet moves by history. A stage is only
+        collected and sorted once every move before it failed to cut off.
+        """
         if color == 'black':
-            pieces = state.black_pieces
-            locations = state.black_locations
-            options = state.black_options
+            pieces, locations, options = state.black_pieces, state.black_locations, state.black_options
+            enemy, enemy_ep, last_row = 'white', state.white_ep, 0
         else:
-            pieces = state.white_pieces
-            locations = state.white_locations
-            options = state.white_options
+            pieces, locations, options = state.white_pieces, state.white_locations, state.white_options
+            enemy, enemy_ep, last_row = 'black', state.black_ep, 7
+        board = state.board
         
-        for i in range(len(pieces)):
-            for move in options[i]:
-                moves.append((locations[i], move))
-        return moves
-    
-    def _make_test_move(self, state, move, color):
-        """Create a test state with a move applied"""
-        try:
-            new_state = copy.deepcopy(state)
-            from_pos, to_pos = move
-            
-            if color == 'black':
-                if from_pos not in new_state.black_locations:
-                    return None
-                piece_index = new_state.black_locations.index(from_pos)
-                new_state.black_locations[piece_index] = to_pos
-                new_state.black_moved[piece_index] = True
-                
-                # Check for captures
-                if to_pos in new_state.white_locations:
-                    white_piece = new_state.white_locations.index(to_pos)
-                    new_state.white_pieces.pop(white_piece)
-                    new_state.white_locations.pop(white_piece)
-                    new_state.white_moved.pop(white_piece)
-                
-                new_state.turn_step = 0
+        if tt_move is not None:
+            tt_move = tt_move[:2]
+            if self._is_pseudo_legal(state, tt_move, color):
+                yield STAGE_TT, tt_move
             else:
-                if from_pos not in new_state.white_locations:
-                    return None
-                piece_index = new_state.white_locations.index(from_pos)
-                new_state.white_locations[piece_index] = to_pos
-                new_state.white_moved[piece_index] = True
-                
-                # Check for captures
-                if to_pos in new_state.black_locations:
-                    black_piece = new_state.black_locations.index(to_pos)
-                    new_state.black_pieces.pop(black_piece)
-                    new_state.black_locations.pop(black_piece)
-                    new_state.black_moved.pop(black_piece)
-                
-                new_state.turn_step = 2
-            
-            # Update options
-            new_state._update_options()
-            return new_state
-        except:
+                tt_move = None
+        
+        enemy_occupied = board.occupied[enemy]
+        captures = []
+        for i, piece in enumerate(pieces):
+            from_pos = locations[i]
+            for to_pos in options[i]:
+                to_bit = POS_BITS[to_pos]
+                if enemy_occupied & to_bit:
+                    victim = board.piece_on(enemy, to_bit)
+                elif piece == 'pawn' and to_pos == enemy_ep:
+                    victim = 'pawn'
+                elif piece == 'pawn' and to_pos[1] == last_row:
+                    victim = 'queen'  # a promotion gains about as much
+                else:
+                    continue
+                captures.append((MVV_LVA[victim][piece], (from_pos, to_pos)))
+        captures.sort(key=lambda capture: capture[0], reverse=True)
+        for _, move in captures:
+            if move != tt_move:
+                yield STAGE_CAPTURES, move
+        
+        killers = self.killers[ply] if ply is not None else ()
+        for killer in killers:
+            if killer is not None and killer != tt_move and self._is_pseudo_legal(state, killer, color) \
+                    and self._is_quiet(state, killer, color):
+                yield STAGE_KILLERS, killer
+        
+        history = self.history[color]
+        quiets = []
+        for i, piece in enumerate(pieces):
+            from_pos = locations[i]
+            for to_pos in options[i]:
+                if enemy_occupied & POS_BITS[to_pos]:
+                    continue
+                if piece == 'pawn' and (to_pos == enemy_ep or to_pos[1] == last_row):
+                    continue
+                quiets.append((from_pos, to_pos))
+        # Castling is only generated for the side to move
+        for king_target, _ in state.castling_moves:
+            quiets.append(((3, 0 if color == 'white' else 7), king_target))
+        quiets.sort(key=lambda move: history[(move[0][1] * 8 + move[0][0]) * 64 + move[1][1] * 8 + move[1][0]],
+                    reverse=True)
+        for move in quiets:
+            if move != tt_move and move not in killers:
+                yield STAGE_QUIETS, move
+    
+    def _is_pseudo_legal(self, state, move, color):
+        """Whether a move from the table or the killers can be played in this position"""
+        from_pos, to_pos = move
+        if not state.board.occupied[color] & POS_BITS[from_pos]:
+            return False
+        locations, options = (state.white_locations, state.white_options) if color == 'white' \
+            else (state.black_locations, state.black_options)
+        if to_pos in options[locations.index(from_pos)]:
+            return True
+        return any(king_target == to_pos for king_target, _ in state.castling_moves) \
+            and from_pos == (3, 0 if color == 'white' else 7)
+    
+    def _probe_bitbases(self, state):
+        """Exact endgame result from the bitbases as a black-perspective score, or None"""
+        if not self.bitbases or len(state.white_pieces) + len(state.black_pieces) != 3:
+            return None
+        # The tables only hold legal positions: leave king captures to the search
+        if movegen.in_check(state, 'black' if state.turn_step < 2 else 'white'):
+            return None
+        result = self.bitbases.probe(state)
+        if result is None:
             return None
+        strong, wins = result
+        if not wins:
+            return 0
+        # Among won positions prefer the weak king near the edge with few escape squares,
+        # the kings close together and the pawn advanced, so the search makes progress
+        if strong == 'white':
+            pieces, locations, weak_king = state.white_pieces, state.white_locations, state.black_locations[0]
+        else:
+            pieces, locations, weak_king = state.black_pieces, state.black_locations, state.white_locations[0]
+        strong_king = locations[pieces.index('king')]
+        center_distance = max(3 - weak_king[0], weak_king[0] - 4) + max(3 - weak_king[1], weak_king[1] - 4)
+        king_distance = abs(strong_king[0] - weak_king[0]) + abs(strong_king[1] - weak_king[1])
+        weak_options = state.black_options[0] if strong == 'white' else state.white_options[0]
+        escapes = sum(1 for target in weak_options if not movegen.is_square_attacked(state, target, strong))
+        score = KNOWN_WIN_SCORE + 10 * center_distance + 10 * (14 - king_distance) + 20 * (8 - escapes)
+        piece = pieces[1 - pieces.index('king')]
+        score += self.piece_values[piece]  # so that promoting still pays
+        if piece == 'pawn':
+            pawn_row = locations[pieces.index('pawn')][1]
+            score += 20 * (pawn_row if strong == 'white' else 7 - pawn_row)
+        return score if strong == 'black' else -score
     
     def _evaluate(self, state):
-        """Evaluate the board position with advanced heuristics"""
+        """Evaluate the board position from black's (the AI's) point of view"""
         score = 0
         
         # Check for checkmate
         if state.winner == 'white':
-            return 100000
+            return -WIN_SCORE
         elif state.winner == 'black':
-            return -100000
+            return WIN_SCORE
         
-        # Material evaluation
-        white_material = sum(self.piece_values.get(piece, 0) for piece in state.white_pieces)
-        black_material = sum(self.piece_values.get(piece, 0) for piece in state.black_pieces)
-        score += white_material - black_material
+        known = self._probe_bitbases(state)
+        if known is not None:
+            return known
         
-        # Position evaluation using piece-square tables
-        score += self._position_score(state.white_pieces, state.white_locations, True)
-        score -= self._position_score(state.black_pieces, state.black_locations, False)
+        # Material and piece-square tables, kept up to date by GameState on every move
+        score += state.psqt_score
         
         # Mobility (number of legal moves)
         white_mobility = sum(len(moves) for moves in state.white_options)
@@ -325,36 +929,14 @@ class MinimaxAI:
         score += self._king_safety(state, True) - self._king_safety(state, False)
         
         # Pawn structure
-        score += self._pawn_structure(state, True) - self._pawn_structure(state, False)
+        pawn_score = self.pawn_hash.probe(state.pawn_key)
+        if pawn_score is None:
+            pawn_score = self._pawn_structure(state, True) - self._pawn_structure(state, False)
+            self.pawn_hash.store(state.pawn_key, pawn_score)
+        score += pawn_score
         
-        return score
-    
-    def _position_score(self, pieces, locations, is_white):
-        """Position evaluation using piece-square tables"""
-        score = 0
-        
-        for i, piece in enumerate(pieces):
-            if i >= len(locations):
-                continue
-            col, row = locations[i]
-            
-            # Flip table for black pieces
-            table_row = row if is_white else 7 - row
-            
-            if piece == 'pawn':
-                score += self.pawn_table[table_row][col]
-            elif piece == 'knight':
-                score += self.knight_table[table_row][col]
-            elif piece == 'bishop':
-                score += self.bishop_table[table_row][col]
-            elif piece == 'rook':
-                score += self.rook_table[table_row][col]
-            elif piece == 'queen':
-                score += self.queen_table[table_row][col]
-            elif piece == 'king':
-                score += self.king_table[table_row][col]
-        
-        return score
+        # The terms above are white-positive, black is the maximizing side
+        return -score
     
     def _king_safety(self, state, is_white):
         """Evaluate king safety"""
@@ -420,233 +1002,328 @@ class MinimaxAI:
 
 
 class StockfishAI:
-    def __init__(self, skill_level=10):
-        """Initialize Stockfish AI"""
+    def __init__(self, skill_level=10, book_path=None, book_max_depth=20, ponder=False,
+                 base_time=DEFAULT_BASE_TIME, increment=DEFAULT_INCREMENT):
+        """Initialize Stockfish AI with a clock of base_time seconds plus increment per move.
+        
+        time_manager.TimeManager turns the clock into soft and hard limits per move; a
+        single legal reply is played at once. With ponder the engine keeps analysing
+        the expected reply, so a correct guess finds the next search's hash warm.
+        
+        Engines come from the process-wide pool in engine_pool.py, one per move. While
+        pondering the engine stays checked out until the next move or stop_pondering().
+        Stockfish is looked up on the first move (engine_pool.warm_up() does it earlier).
+        """
         self.skill_level = skill_level
-        self.engine = None
-        self._init_stockfish()
+        self.book = load_book(book_path, book_max_depth)
+        self.ponder = ponder
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        self.clock = TimeManager(base_time, increment)
+        # One object per game: python-chess sends ucinewgame when an engine sees a new one
+        self._game = object()
+        self._ponder_board = None
+        self._ponder_analysis = None
+        # The game so far, kept in step with the GameState one move at a time
+        self.board = None
+        self._fallback = None
+        self.engine = None  # checked out from the pool during a move or while pondering
+        self.pool = None
+        self._pool_resolved = False
     
-    def _init_stockfish(self):
-        """Initialize Stockfish engine"""
-        try:
-            import chess
-            import chess.engine
-            
-            # Try to find Stockfish
-            import subprocess
-            import platform
-            import os
-            
-            # Common paths for Stockfish
-            if platform.system() == 'Windows':
-                stockfish_paths = [
-                    'stockfish.exe',
-                    './stockfish.exe',
-                    os.path.join(os.getcwd(), 'stockfish.exe'),
-                    'C:/stockfish/stockfish.exe',
-                    os.path.expanduser('~/stockfish.exe')
-                ]
-            else:
-                stockfish_paths = [
-                    'stockfish',
-                    './stockfish',
-                    '/usr/bin/stockfish',
-                    '/usr/local/bin/stockfish',
-                    '/opt/homebrew/bin/stockfish'  # macOS Apple Silicon
-                ]
-            
-            stockfish_path = None
-            for path in stockfish_paths:
+    def _get_pool(self):
+        """The shared engine pool, or None without python-chess or a Stockfish binary.
+        
+        A pool closed by engine_pool.configure_pool() or a change of binary is swapped
+        for the current one.
+        """
+        if self.pool is not None and self.pool.closed:
+            self.stop_pondering()  # the engine goes back to the pool it came from
+            self.pool = shared_pool()
+        if not self._pool_resolved:
+            self._pool_resolved = True
+            try:
+                import chess.engine  # noqa: F401
+            except ImportError:
+                print("python-chess not installed. Install with: pip install python-chess")
+                return None
+            self.pool = shared_pool()
+        return self.pool
+    
+    def _fallback_ai(self):
+        """Minimax for when Stockfish is unavailable or failed"""
+        if self._fallback is None:
+            self._fallback = MinimaxAI(depth=3)
+        return self._fallback
+    
+    def _fallback_move(self, game_state):
+        return self._fallback_ai().get_move(game_state)
+    
+    def _release_engine(self, healthy=True):
+        if self.engine is not None:
+            self.pool.release(self.engine, healthy)
+            self.engine = None
+    
+    def get_move(self, game_state):
+        """Get move from Stockfish"""
+        if game_state.turn_step < 2:  # Black's turn only
+            return None
+        board = self._sync_board(game_state)
+        move = self._choose_move(game_state, board)
+        self._record_move(board, move)
+        return move
+    
+    def _choose_move(self, game_state, board):
+        if self.book:
+            book_move = self.book.pick(game_state)
+            if book_move:
+                self.stop_pondering()
+                return book_move[:2]
+        
+        if board is None or not board.is_valid():
+            if board is not None:
+                print("Warning: Invalid board state, using minimax fallback")
+            self.stop_pondering()
+            return self._fallback_move(game_state)
+        
+        # A single legal reply needs no search; mate and stalemate are left to minimax
+        moves = list(board.legal_moves)
+        if len(moves) <= 1:
+            self.stop_pondering()
+            return self._forced_move(moves[0]) if moves else self._fallback_move(game_state)
+        
+        if not self._get_pool():
+            # Fallback to minimax if Stockfish not available
+            return self._fallback_move(game_state)
+        
+        # A crashed engine is replaced by the pool and the move tried once more
+        for attempt in range(ENGINE_ATTEMPTS):
+            if self.engine is None:
                 try:
-                    # Check if file exists
-                    if not os.path.exists(path):
-                        continue
-                    # Try to run it
-                    result = subprocess.run([path, '--help'], capture_output=True, timeout=2)
-                    if result.returncode == 0 or 'Stockfish' in str(result.stderr) or 'Stockfish' in str(result.stdout):
-                        stockfish_path = path
-                        print(f"Found Stockfish at: {path}")
-                        break
+                    self.engine = self.pool.acquire(timeout=ENGINE_WAIT_TIMEOUT)
+                except TimeoutError:
+                    print("No Stockfish engine available, using minimax fallback")
+                    break
                 except Exception as e:
+                    print(f"Error starting Stockfish: {e}")
                     continue
+            # A hung engine times out here too; it is replaced like a crashed one
+            try:
+                self._finish_pondering(board)
+                move, ponder_move = self._search(board)
+            except Exception as e:
+                print(f"Error getting Stockfish move: {e!r}")
+                self._ponder_board = self._ponder_analysis = None
+                self._release_engine(healthy=False)
+                continue
             
-            if stockfish_path:
-                try:
-                    self.engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
-                    # Configure for maximum strength
-                    self.engine.configure({
-                        "Skill Level": 20,  # Maximum skill (0-20)
-                        "UCI_LimitStrength": False,
-                        "Threads": 4,
-                        "Hash": 512,  # More hash for better play
-                        "MultiPV": 1,
-                        "Contempt": 0
-                    })
-                    self.chess_board = chess.Board()
-                    print("Stockfish engine initialized successfully!")
-                except Exception as e:
-                    print(f"Error starting Stockfish engine: {e}")
-                    self.engine = None
+            if self.ponder and ponder_move:
+                self._start_pondering(board, move, ponder_move)
             else:
-                print("Stockfish not found. Attempting to download...")
-                # Try to download Stockfish
-                try:
-                    from install_stockfish import install_stockfish
-                    downloaded_path = install_stockfish()
-                    if downloaded_path and os.path.exists(downloaded_path):
-                        self.engine = chess.engine.SimpleEngine.popen_uci(downloaded_path)
-                        self.engine.configure({
-                            "Skill Level": 20,
-                            "UCI_LimitStrength": False,
-                            "Threads": 4,
-                            "Hash": 512
-                        })
-                        self.chess_board = chess.Board()
-                        print("Stockfish downloaded and initialized!")
-                    else:
-                        print("Could not download Stockfish. Falling back to minimax.")
-                        self.engine = None
-                except Exception as e:
-                    print(f"Could not download Stockfish: {e}")
-                    print("Please download Stockfish manually from: https://stockfishchess.org/download/")
-                    print("Or install via package manager.")
-                    self.engine = None
-        except ImportError:
-            print("python-chess not installed. Install with: pip install python-chess")
-            self.engine = None
-        except Exception as e:
-            print(f"Error initializing Stockfish: {e}")
-            import traceback
-            traceback.print_exc()
-            self.engine = None
+                self._release_engine()
+            return self._convert_move(move)
+        # Fallback to minimax
+        return self._fallback_move(game_state)
     
-    def get_move(self, game_state):
-        """Get move from Stockfish"""
-        if not self.engine:
-            # Fallback to minimax if Stockfish not available
-            minimax = MinimaxAI(depth=3)
-            return minimax.get_move(game_state)
+    def _forced_move(self, move):
+        """Play the only legal move without searching; it still earns the increment"""
+        self.clock.start_move()
+        self.clock.finish_move()
+        return self._convert_move(move)
+    
+    def _search(self, board):
+        """Search board on self.engine within the clock's limits; return (move, ponder move)"""
+        import chess.engine
         
-        if game_state.turn_step >= 2:  # Black's turn
+        _, hard = self.clock.start_move()
+        with self.engine.analysis(board, chess.engine.Limit(time=hard, depth=ENGINE_MAX_DEPTH),
+                                  game=self._game) as analysis:
+            for info in analysis:
+                if self.clock.update(info):
+                    break
+            analysis.stop()
+            best = analysis.wait()
+        self.clock.finish_move()
+        return best.move, best.ponder
+    
+    def _start_pondering(self, board, move, ponder_move):
+        """Analyse the position after move and the expected reply until the next move"""
+        self._ponder_board = board.copy()
+        self._ponder_board.push(move)
+        self._ponder_board.push(ponder_move)
+        self._ponder_analysis = self.engine.analysis(self._ponder_board, game=self._game)
+    
+    def _finish_pondering(self, board):
+        """Stop the ponder search; on a hit its results are in the engine's hash"""
+        if self._ponder_analysis is None:
+            return
+        self._ponder_analysis.stop()
+        if board.move_stack == self._ponder_board.move_stack:
+            self.ponder_hits += 1
+        else:
+            self.ponder_misses += 1
+        self._ponder_board = self._ponder_analysis = None
+    
+    async def get_move_async(self, game_state):
+        """Coroutine version of get_move on python-chess's asyncio engine protocol.
+        
+        Engines come from the running event loop's pool (engine_pool.async_pool).
+        Cancelling the awaiting task stops the engine's search and hands the engine
+        back. Moves made this way are not pondered on.
+        """
+        if game_state.turn_step < 2:
+            return None
+        board = self._sync_board(game_state)
+        move = await self._choose_move_async(game_state, board)
+        self._record_move(board, move)
+        return move
+    
+    async def _choose_move_async(self, game_state, board):
+        self.stop_pondering()  # an engine may still be pondering after a get_move call
+        if self.book:
+            book_move = self.book.pick(game_state)
+            if book_move:
+                return book_move[:2]
+        
+        if board is None or not board.is_valid():
+            if board is not None:
+                print("Warning: Invalid board state, using minimax fallback")
+            return await self._fallback_ai().get_move_async(game_state)
+        
+        moves = list(board.legal_moves)
+        if len(moves) <= 1:
+            return self._forced_move(moves[0]) if moves else await self._fallback_ai().get_move_async(game_state)
+        
+        if not self._pool_resolved or (self.pool is not None and self.pool.closed):
+            # Discovery may probe binaries or even download Stockfish
+            await asyncio.get_running_loop().run_in_executor(None, self._get_pool)
+        if not self.pool:
+            return await self._fallback_ai().get_move_async(game_state)
+        
+        pool = async_pool(self.pool.path)
+        for attempt in range(ENGINE_ATTEMPTS):
             try:
-                # Ensure game state is up to date
-                game_state._update_options()
-                
-                # Convert game state to chess.Board
-                board = self._state_to_board(game_state)
-                
-                # Verify board is valid
-                if not board.is_valid():
-                    print("Warning: Invalid board state, using minimax fallback")
-                    minimax = MinimaxAI(depth=3)
-                    return minimax.get_move(game_state)
-                
-                # Get best move from Stockfish with maximum strength
-                # Use both time and depth limits for best play
-                result = self.engine.play(board, chess.engine.Limit(time=2.0, depth=20))
-                move = result.move
-                
-                # Log the move for debugging
-                print(f"Stockfish move: {move} (from {move.from_square} to {move.to_square})")
-                
-                # Convert chess.Move to our format
-                # chess library: square = row * 8 + col, where row 0 is bottom (a1)
-                # Our system: (col, row) where row 0 is top (white pieces)
-                from_square = move.from_square
-                to_square = move.to_square
-                
-                # Convert from chess square to our coordinates
-                from_col = from_square % 8
-                from_row = 7 - (from_square // 8)  # Flip row
-                to_col = to_square % 8
-                to_row = 7 - (to_square // 8)  # Flip row
-                
-                from_pos = (from_col, from_row)
-                to_pos = (to_col, to_row)
-                
-                return (from_pos, to_pos)
+                engine = await pool.acquire(timeout=ENGINE_WAIT_TIMEOUT)
+            except TimeoutError:
+                print("No Stockfish engine available, using minimax fallback")
+                break
             except Exception as e:
-                print(f"Error getting Stockfish move: {e}")
-                import traceback
-                traceback.print_exc()
-                # Fallback to minimax
-                minimax = MinimaxAI(depth=3)
-                return minimax.get_move(game_state)
-        return None
+                print(f"Error starting Stockfish: {e}")
+                continue
+            try:
+                move = await self._search_async(engine, board)
+            except asyncio.CancelledError:
+                pool.release(engine)  # the search is stopped; the next command waits for bestmove
+                raise
+            except Exception as e:
+                print(f"Error getting Stockfish move: {e!r}")
+                pool.release(engine, healthy=False)
+                continue
+            pool.release(engine)
+            return self._convert_move(move)
+        return await self._fallback_ai().get_move_async(game_state)
     
-    def _state_to_board(self, game_state):
-        """Convert game state to chess.Board"""
-        import chess
+    async def _search_async(self, engine, board):
+        """_search on an asyncio engine; return our move"""
+        import chess.engine
         
-        board = chess.Board()
-        board.clear()
-        
-        # Set up white pieces
-        for i, piece in enumerate(game_state.white_pieces):
-            if i < len(game_state.white_locations):
-                pos = game_state.white_locations[i]
-                # Our system: (col, row) where row 0 is top
-                # chess: square = row * 8 + col, where row 0 is bottom
-                col, row = pos[0], pos[1]
-                chess_row = 7 - row  # Flip row coordinate
-                square = chess.square(col, chess_row)
-                piece_type = self._piece_to_chess_piece(piece, True)
-                if piece_type:
-                    board.set_piece_at(square, piece_type)
-        
-        # Set up black pieces
-        for i, piece in enumerate(game_state.black_pieces):
-            if i < len(game_state.black_locations):
-                pos = game_state.black_locations[i]
-                col, row = pos[0], pos[1]
-                chess_row = 7 - row  # Flip row coordinate
-                square = chess.square(col, chess_row)
-                piece_type = self._piece_to_chess_piece(piece, False)
-                if piece_type:
-                    board.set_piece_at(square, piece_type)
-        
-        # Set turn (0-1 = white, 2-3 = black)
-        board.turn = chess.WHITE if game_state.turn_step < 2 else chess.BLACK
-        
-        # Set castling rights based on moved pieces
-        board.castling_rights = chess.BB_ALL
-        if game_state.white_moved and len(game_state.white_moved) > 3:
-            if game_state.white_moved[3]:  # King moved
-                board.castling_rights &= ~chess.BB_RANK_1
-            if game_state.white_moved[0]:  # Rook a1 moved
-                board.castling_rights &= ~chess.BB_A1
-            if game_state.white_moved[7]:  # Rook h1 moved
-                board.castling_rights &= ~chess.BB_H1
-        if game_state.black_moved and len(game_state.black_moved) > 3:
-            if game_state.black_moved[3]:  # King moved
-                board.castling_rights &= ~chess.BB_RANK_8
-            if game_state.black_moved[0]:  # Rook a8 moved
-                board.castling_rights &= ~chess.BB_A8
-            if game_state.black_moved[7]:  # Rook h8 moved
-                board.castling_rights &= ~chess.BB_H8
-        
-        return board
-    
-    def _piece_to_chess_piece(self, piece_name, is_white):
-        """Convert piece name to chess.Piece"""
-        import chess
+        _, hard = self.clock.start_move()
+        analysis = await engine.analysis(board, chess.engine.Limit(time=hard, depth=ENGINE_MAX_DEPTH),
+                                         game=self._game)
+        try:
+            async for info in analysis:
+                if self.clock.update(info):
+                    break
+            analysis.stop()
+            best = await analysis.wait()
+        finally:
+            analysis.stop()
+        self.clock.finish_move()
+        return best.move
+    
+    def get_move_future(self, game_state, loop=None):
+        """Run get_move_async on loop (a background event loop by default) and return a
+        concurrent.futures.Future; cancelling it stops the engine as well.
+        
+        Call it from a thread other than loop's, e.g. a GUI's main loop.
+        """
+        state = copy.deepcopy(game_state)
+        return asyncio.run_coroutine_threadsafe(self.get_move_async(state), loop or _background_loop())
+    
+    def _convert_move(self, move):
+        """Convert a chess.Move to our (from_pos, to_pos) format"""
+        # UCI squares and our (col, row) coordinates differ in their file order,
+        # movegen converts between them
+        return movegen.move_from_uci(move.uci())[:2]
+    
+    def stop_pondering(self):
+        """Stop the engine's background search and hand the engine back to the pool"""
+        if self._ponder_analysis is not None:
+            analysis, self._ponder_board, self._ponder_analysis = self._ponder_analysis, None, None
+            try:
+                analysis.stop()
+            except Exception:
+                self._release_engine(healthy=False)
+        self._release_engine()
+    
+    def _sync_board(self, game_state):
+        """Bring the persistent chess.Board up to game_state; None without python-chess.
+        
+        The moves played since the last call are found by trying each legal move on the
+        board, so the engine is sent `position startpos moves ...` with the whole game
+        and can see repetitions. When no move leads to game_state (a new game, a loaded
+        position, a take-back) the board restarts from the start position or, failing
+        that, from game_state's FEN, and the engine is told a new game has begun.
+        """
+        try:
+            import chess
+        except ImportError:
+            return None
+        
+        fen = game_state.get_fen()
+        target = fen.split()[:2]  # piece placement and side to move
         
-        piece_map = {
-            'pawn': chess.PAWN,
-            'rook': chess.ROOK,
-            'knight': chess.KNIGHT,
-            'bishop': chess.BISHOP,
-            'queen': chess.QUEEN,
-            'king': chess.KING
-        }
+        def placement(board):
+            return [board.board_fen(), 'w' if board.turn == chess.WHITE else 'b']
+        
+        candidates = [chess.Board()] if self.board is None else [self.board, chess.Board()]
+        for board in candidates:
+            if placement(board) == target:
+                break
+            for move in board.legal_moves:
+                board.push(move)
+                if placement(board) == target:
+                    break
+                board.pop()
+            else:
+                continue
+            break
+        else:
+            board = chess.Board(fen)
+        if board is not self.board:
+            self.board = board
+            self._game = object()
+            self.clock.new_game()
+        return self.board
+    
+    def _record_move(self, board, move):
+        """Play our move on the persistent board; forget the board if it cannot follow"""
+        if board is None or move is None:
+            return
+        import chess
         
-        color = chess.WHITE if is_white else chess.BLACK
-        return chess.Piece(piece_map[piece_name], color)
+        chess_move = chess.Move.from_uci(movegen.move_to_uci(move))
+        if board.piece_type_at(chess_move.from_square) == chess.PAWN \
+                and chess.square_rank(chess_move.to_square) in (0, 7):
+            chess_move.promotion = chess_move.promotion or chess.QUEEN  # as GameState.push()
+        if board.is_legal(chess_move):
+            board.push(chess_move)
+        else:
+            self.board = None
     
     def __del__(self):
-        """Clean up Stockfish engine"""
-        if self.engine:
-            try:
-                self.engine.quit()
-            except:
-                pass
+        """Hand a still checked-out engine back to the pool"""
+        try:
+            self.stop_pondering()
+        except Exception:
+            pass
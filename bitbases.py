@@ -0,0 +1,296 @@
+# Endgame bitbases (framework-agnostic)
+# Win/draw tables for king + one piece against a bare king, generated locally by
+# retrograde analysis and stored as packed bit arrays, one bit per position:
+# set when the side with the extra piece wins with best play.
+#
+# Positions are stored with the strong side as white (pawns moving towards row 7);
+# positions where black is strong are mirrored top to bottom before probing.
+# Index: side_to_move << 18 | strong_king << 12 | piece << 6 | weak_king, squares
+# numbered row * 8 + col and side_to_move 0 when the strong side is to move.
+# Castling rights and the fifty-move rule are ignored.
+#
+# Run `python bitbases.py` to (re)build the default set in ./bitbases.
+import argparse
+import mmap
+import os
+import sys
+import time
+from collections import deque
+
+from bitboard import KING_ATTACKS, KNIGHT_ATTACKS, BISHOP_RAYS, ROOK_RAYS, QUEEN_RAYS, PAWN_ATTACKERS, iter_squares
+
+PIECE_LETTERS = {'queen': 'Q', 'rook': 'R', 'bishop': 'B', 'knight': 'N', 'pawn': 'P'}
+LETTER_PIECES = {letter: piece for piece, letter in PIECE_LETTERS.items()}
+DEFAULT_SIGNATURES = ('KQK', 'KRK', 'KPK')
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bitbases')
+# A pawn on its last row promotes to one of these, looked up in their own tables
+PROMOTION_SIGNATURES = ('KQK', 'KRK')
+
+KING_NEIGHBORS = [tuple(iter_squares(mask)) for mask in KING_ATTACKS]
+
+POSITIONS = 2 * 64 * 64 * 64
+TABLE_BYTES = POSITIONS // 8
+WEAK_TO_MOVE = 1 << 18
+
+
+def _index(side_to_move, strong_king, piece, weak_king):
+    return side_to_move << 18 | strong_king << 12 | piece << 6 | weak_king
+
+
+def _slider_attacks(rays, square, blocker):
+    mask = 0
+    for ray in rays[square]:
+        for _, bit in ray:
+            mask |= bit
+            if bit == blocker:
+                break
+    return mask
+
+
+def _piece_attacks(piece):
+    """attacks[piece_square][strong_king] for a white piece, the strong king being the only blocker.
+
+    The weak king never blocks its own attackers, so the same mask answers both
+    "is the weak king in check" and "may the weak king step there".
+    """
+    table = []
+    for square in range(64):
+        row = []
+        for king in range(64):
+            blocker = 1 << king
+            if piece == 'queen':
+                row.append(_slider_attacks(QUEEN_RAYS, square, blocker))
+            elif piece == 'rook':
+                row.append(_slider_attacks(ROOK_RAYS, square, blocker))
+            elif piece == 'bishop':
+                row.append(_slider_attacks(BISHOP_RAYS, square, blocker))
+            elif piece == 'knight':
+                row.append(KNIGHT_ATTACKS[square])
+            else:
+                # white pawns attack towards higher rows, see PAWN_ATTACKERS
+                row.append(sum(1 << target for target in range(64) if PAWN_ATTACKERS['white'][target] >> square & 1))
+        table.append(row)
+    return table
+
+
+def _piece_targets(piece, square, occupied):
+    """Squares a white piece on square can move to (not capture) with occupied blocked"""
+    if piece == 'pawn':
+        targets = []
+        if square + 8 < 64 and not occupied >> (square + 8) & 1:
+            targets.append(square + 8)
+            if square >> 3 == 1 and not occupied >> (square + 16) & 1:
+                targets.append(square + 16)
+        return targets
+    if piece == 'knight':
+        return [target for target in iter_squares(KNIGHT_ATTACKS[square]) if not occupied >> target & 1]
+    rays = {'queen': QUEEN_RAYS, 'rook': ROOK_RAYS, 'bishop': BISHOP_RAYS}[piece]
+    targets = []
+    for ray in rays[square]:
+        for (col, row), bit in ray:
+            if occupied & bit:
+                break
+            targets.append(row * 8 + col)
+    return targets
+
+
+def _pawn_origins(square, occupied):
+    """Squares a white pawn on square can have come from without capturing"""
+    origins = []
+    if square >> 3 >= 2 and not occupied >> (square - 8) & 1:
+        origins.append(square - 8)
+        if square >> 3 == 3 and not occupied >> (square - 16) & 1:
+            origins.append(square - 16)
+    return origins
+
+
+def generate(signature, tables=None):
+    """Solve one 'K?K' signature and return its packed bit array.
+
+    tables maps already generated signatures to their bytes; KPK needs KQK and KRK
+    for promotions. Works backwards from the mates: a position with the strong side
+    to move is won when one move reaches a won position, a position with the weak
+    side to move when every legal move does.
+    """
+    piece = LETTER_PIECES[signature[1]]
+    attacks = _piece_attacks(piece)
+    bits = bytearray(TABLE_BYTES)
+    # Legal weak king moves not yet known to lose, per weak-to-move position
+    remaining = {}
+    queue = deque()
+
+    def win(index):
+        bits[index >> 3] |= 1 << (index & 7)
+        queue.append(index)
+
+    def is_won(index):
+        return bits[index >> 3] >> (index & 7) & 1
+
+    def legal(side_to_move, strong_king, square, weak_king):
+        if strong_king == square or weak_king == square or strong_king == weak_king:
+            return False
+        if KING_ATTACKS[strong_king] >> weak_king & 1:
+            return False
+        if piece == 'pawn' and square >> 3 in (0, 7):
+            return False
+        # with the strong side to move the weak king must not be in check
+        return side_to_move == 1 or not attacks[square][strong_king] >> weak_king & 1
+
+    for strong_king in range(64):
+        for square in range(64):
+            attacked_by_strong = None
+            for weak_king in range(64):
+                if legal(1, strong_king, square, weak_king):
+                    if attacked_by_strong is None:
+                        attacked_by_strong = KING_ATTACKS[strong_king] | attacks[square][strong_king]
+                    moves = 0
+                    for target in KING_NEIGHBORS[weak_king]:
+                        if target == strong_king:
+                            continue
+                        if target == square:
+                            # capturing the piece draws unless the strong king defends it
+                            moves += not KING_ATTACKS[strong_king] >> square & 1
+                        elif not attacked_by_strong >> target & 1:
+                            moves += 1
+                    index = _index(1, strong_king, square, weak_king)
+                    if moves:
+                        remaining[index] = moves
+                    elif attacked_by_strong >> weak_king & 1:
+                        win(index)  # checkmate
+                if piece == 'pawn' and square >> 3 == 6 and legal(0, strong_king, square, weak_king):
+                    promotion_square = square + 8
+                    if promotion_square in (strong_king, weak_king):
+                        continue
+                    for promoted in PROMOTION_SIGNATURES:
+                        table = tables[promoted]
+                        target = _index(1, strong_king, promotion_square, weak_king)
+                        if table[target >> 3] >> (target & 7) & 1:
+                            win(_index(0, strong_king, square, weak_king))
+                            break
+
+    while queue:
+        index = queue.popleft()
+        strong_king, square, weak_king = index >> 12 & 63, index >> 6 & 63, index & 63
+        if index & WEAK_TO_MOVE:
+            # the strong side just moved here: its king or its piece came from elsewhere
+            occupied = 1 << strong_king | 1 << square | 1 << weak_king
+            for origin in KING_NEIGHBORS[strong_king]:
+                if not occupied >> origin & 1 and legal(0, origin, square, weak_king):
+                    previous = _index(0, origin, square, weak_king)
+                    if not is_won(previous):
+                        win(previous)
+            if piece == 'pawn':
+                origins = _pawn_origins(square, occupied)
+            else:
+                # piece moves are reversible, only the kings block
+                origins = _piece_targets(piece, square, 1 << strong_king | 1 << weak_king)
+            for origin in origins:
+                if legal(0, strong_king, origin, weak_king):
+                    previous = _index(0, strong_king, origin, weak_king)
+                    if not is_won(previous):
+                        win(previous)
+        else:
+            # the weak king just moved here: one more of its escapes is lost
+            for origin in KING_NEIGHBORS[weak_king]:
+                if origin in (strong_king, square):
+                    continue
+                previous = _index(1, strong_king, square, origin)
+                if previous in remaining:
+                    remaining[previous] -= 1
+                    if not remaining[previous]:
+                        del remaining[previous]
+                        win(previous)
+    return bytes(bits)
+
+
+def build(signatures=DEFAULT_SIGNATURES, directory=DEFAULT_DIRECTORY, verbose=True):
+    """Generate the given signatures (and what they depend on) into directory"""
+    os.makedirs(directory, exist_ok=True)
+    wanted = list(signatures)
+    if 'KPK' in wanted:
+        wanted = [signature for signature in PROMOTION_SIGNATURES if signature not in wanted] + wanted
+        wanted.remove('KPK')
+        wanted.append('KPK')
+    tables = {}
+    for signature in wanted:
+        start = time.perf_counter()
+        tables[signature] = generate(signature, tables)
+        with open(os.path.join(directory, signature + '.bb'), 'wb') as table_file:
+            table_file.write(tables[signature])
+        if verbose:
+            wins = sum(bin(byte).count('1') for byte in tables[signature])
+            print(f'{signature}: {wins} won positions, {time.perf_counter() - start:.1f}s')
+    return tables
+
+
+class Bitbases:
+    """Memory-mapped bitbases found in a directory, probed with a GameState.
+    
+    probes counts the three-piece positions asked about, hits those a table covered.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.tables = {}
+        self.probes = 0
+        self.hits = 0
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            signature, extension = os.path.splitext(name)
+            if extension != '.bb' or len(signature) != 3 or signature[1] not in LETTER_PIECES:
+                continue
+            with open(os.path.join(directory, name), 'rb') as table_file:
+                if os.fstat(table_file.fileno()).st_size == TABLE_BYTES:
+                    self.tables[LETTER_PIECES[signature[1]]] = mmap.mmap(table_file.fileno(), 0,
+                                                                         access=mmap.ACCESS_READ)
+
+    def __bool__(self):
+        return bool(self.tables)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+
+    def probe(self, state):
+        """Return (strong_color, strong_side_wins) when a table covers state, else None"""
+        if len(state.white_pieces) + len(state.black_pieces) != 3:
+            return None
+        self.probes += 1
+        if len(state.white_pieces) == 2:
+            strong, pieces, locations, weak_locations, mirror = 'white', state.white_pieces, \
+                state.white_locations, state.black_locations, 0
+        else:
+            strong, pieces, locations, weak_locations, mirror = 'black', state.black_pieces, \
+                state.black_locations, state.white_locations, 56
+        piece_index = 1 if pieces[0] == 'king' else 0
+        table = self.tables.get(pieces[piece_index])
+        if table is None or 'king' not in pieces or not weak_locations:
+            return None
+        self.hits += 1
+        strong_king, square, weak_king = (
+            (location[1] * 8 + location[0]) ^ mirror
+            for location in (locations[1 - piece_index], locations[piece_index], weak_locations[0]))
+        side_to_move = 0 if (state.turn_step < 2) == (strong == 'white') else 1
+        index = _index(side_to_move, strong_king, square, weak_king)
+        return strong, bool(table[index >> 3] >> (index & 7) & 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate endgame bitbases by retrograde analysis')
+    parser.add_argument('signatures', nargs='*', default=list(DEFAULT_SIGNATURES),
+                        help='material signatures such as KQK KRK KPK (default: %(default)s)')
+    parser.add_argument('--dir', default=DEFAULT_DIRECTORY, help='output directory')
+    args = parser.parse_args(argv)
+    for signature in args.signatures:
+        if len(signature) != 3 or signature[0] != 'K' or signature[2] != 'K' or signature[1] not in LETTER_PIECES:
+            parser.error(f'unsupported signature {signature}, expected K?K with ? one of QRBNP')
+    build(args.signatures, args.dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
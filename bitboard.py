@@ -0,0 +1,186 @@
+# Bitboard position core (framework-agnostic)
+# Squares are numbered row * 8 + col using the game's (col, row) coordinates,
+# so white's back rank is squares 0-7 and black's back rank is squares 56-63.
+
+PIECE_TYPES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+COLORS = ('white', 'black')
+
+# Single-bit mask for every on-board (col, row) coordinate.
+# Off-board coordinates are simply missing, so POS_BITS.get(pos, 0) is 0 for them.
+POS_BITS = {(col, row): 1 << (row * 8 + col) for row in range(8) for col in range(8)}
+SQUARE_POSITIONS = [(sq & 7, sq >> 3) for sq in range(64)]
+
+KNIGHT_OFFSETS = ((1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1))
+KING_OFFSETS = ((1, 0), (1, 1), (1, -1), (-1, 0), (-1, 1), (-1, -1), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, -1), (-1, -1), (1, 1), (-1, 1))
+ROOK_DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+
+
+def _step_targets(offsets):
+    """Per-square tuple of ((col, row), bit) for every on-board offset target"""
+    table = []
+    for col, row in SQUARE_POSITIONS:
+        targets = []
+        for x, y in offsets:
+            target = (col + x, row + y)
+            if target in POS_BITS:
+                targets.append((target, POS_BITS[target]))
+        table.append(tuple(targets))
+    return table
+
+
+def _rays(directions):
+    """Per-square tuple of rays, each ray a tuple of ((col, row), bit) walking outwards"""
+    table = []
+    for col, row in SQUARE_POSITIONS:
+        rays = []
+        for x, y in directions:
+            ray = []
+            target = (col + x, row + y)
+            while target in POS_BITS:
+                ray.append((target, POS_BITS[target]))
+                target = (target[0] + x, target[1] + y)
+            rays.append(tuple(ray))
+        table.append(tuple(rays))
+    return table
+
+
+def _mask(targets):
+    mask = 0
+    for _, bit in targets:
+        mask |= bit
+    return mask
+
+
+# Precomputed attack tables, indexed by square_of(pos)
+KNIGHT_TARGETS = _step_targets(KNIGHT_OFFSETS)
+KING_TARGETS = _step_targets(KING_OFFSETS)
+KNIGHT_ATTACKS = [_mask(targets) for targets in KNIGHT_TARGETS]
+KING_ATTACKS = [_mask(targets) for targets in KING_TARGETS]
+BISHOP_RAYS = _rays(BISHOP_DIRECTIONS)
+ROOK_RAYS = _rays(ROOK_DIRECTIONS)
+QUEEN_RAYS = [bishop + rook for bishop, rook in zip(BISHOP_RAYS, ROOK_RAYS)]
+BISHOP_LINES = [_mask(target for ray in rays for target in ray) for rays in BISHOP_RAYS]
+ROOK_LINES = [_mask(target for ray in rays for target in ray) for rays in ROOK_RAYS]
+# Squares a pawn of the given color would have to stand on to attack each square.
+# White pawns capture towards higher rows, so they attack from the row below.
+PAWN_ATTACKERS = {
+    'white': [_mask(targets) for targets in _step_targets(((1, -1), (-1, -1)))],
+    'black': [_mask(targets) for targets in _step_targets(((1, 1), (-1, 1)))],
+}
+
+
+def square_of(pos):
+    """Convert a (col, row) coordinate to a 0-63 square index"""
+    return pos[1] * 8 + pos[0]
+
+
+def position_of(square):
+    """Convert a 0-63 square index to a (col, row) coordinate"""
+    return SQUARE_POSITIONS[square]
+
+
+def square_name(pos):
+    """Standard algebraic name of a (col, row) coordinate.
+    
+    The board is drawn mirrored: white's king starts on (3, 0), which is e1, so
+    the file letter runs from h at col 0 to a at col 7 and row 0 is rank 1.
+    """
+    return 'hgfedcba'[pos[0]] + str(pos[1] + 1)
+
+
+def parse_square_name(name):
+    """Convert an algebraic square name such as 'e4' to a (col, row) coordinate"""
+    return ('hgfedcba'.index(name[0]), int(name[1]) - 1)
+
+
+def iter_squares(mask):
+    """Yield the square index of every set bit in mask, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class Bitboards:
+    """64-bit occupancy masks per piece type and color"""
+    __slots__ = ('pieces', 'occupied')
+
+    def __init__(self):
+        self.pieces = {color: dict.fromkeys(PIECE_TYPES, 0) for color in COLORS}
+        self.occupied = {color: 0 for color in COLORS}
+
+    @classmethod
+    def from_lists(cls, white_pieces, white_locations, black_pieces, black_locations):
+        """Build masks from the parallel piece/location lists used by GameState"""
+        board = cls()
+        for piece, pos in zip(white_pieces, white_locations):
+            board.add('white', piece, pos)
+        for piece, pos in zip(black_pieces, black_locations):
+            board.add('black', piece, pos)
+        return board
+
+    def copy(self):
+        board = Bitboards.__new__(Bitboards)
+        board.pieces = {color: masks.copy() for color, masks in self.pieces.items()}
+        board.occupied = self.occupied.copy()
+        return board
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def add(self, color, piece, pos):
+        bit = POS_BITS[pos]
+        self.pieces[color][piece] |= bit
+        self.occupied[color] |= bit
+
+    def remove(self, color, piece, pos):
+        bit = POS_BITS[pos]
+        self.pieces[color][piece] &= ~bit
+        self.occupied[color] &= ~bit
+
+    def move(self, color, piece, from_pos, to_pos):
+        change = POS_BITS[from_pos] | POS_BITS[to_pos]
+        self.pieces[color][piece] ^= change
+        self.occupied[color] ^= change
+
+    def replace(self, color, old_piece, new_piece, pos):
+        """Change the type of the piece on pos (pawn promotion)"""
+        bit = POS_BITS[pos]
+        self.pieces[color][old_piece] &= ~bit
+        self.pieces[color][new_piece] |= bit
+
+    @property
+    def all_occupied(self):
+        return self.occupied['white'] | self.occupied['black']
+
+    def is_occupied(self, pos):
+        return bool((self.occupied['white'] | self.occupied['black']) & POS_BITS.get(pos, 0))
+
+    def color_at(self, pos):
+        """Return 'white', 'black' or None for the piece on pos"""
+        bit = POS_BITS.get(pos, 0)
+        if self.occupied['white'] & bit:
+            return 'white'
+        if self.occupied['black'] & bit:
+            return 'black'
+        return None
+
+    def piece_on(self, color, bit):
+        """Return the piece type of color on the square bit, or None"""
+        masks = self.pieces[color]
+        for piece in PIECE_TYPES:
+            if masks[piece] & bit:
+                return piece
+        return None
+
+    def piece_at(self, pos):
+        """Return (color, piece) for the piece on pos, or None if empty"""
+        color = self.color_at(pos)
+        if color is None:
+            return None
+        bit = POS_BITS[pos]
+        for piece, mask in self.pieces[color].items():
+            if mask & bit:
+                return color, piece
+        return None
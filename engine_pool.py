@@ -0,0 +1,702 @@
+# Process-wide pool of Stockfish engines (python-chess)
+# Every StockfishAI checks an engine out for one move and hands it back, so the
+# number of engine processes follows the number of cores instead of the number
+# of games being played. Engines are started lazily, health-checked on checkout
+# and restarted when they have crashed.
+#
+# Games are told apart by the `game` object passed to engine.analysis(); python-chess
+# sends ucinewgame whenever an engine serves a different game than last time.
+#
+# AsyncEnginePool is the asyncio counterpart built on chess.engine.popen_uci: its
+# engines belong to one event loop, and async_pool() keeps one pool per loop.
+# The shared pools draw from one EngineBudget, so using get_move and the async API
+# side by side never runs more engines than configure_pool() allows.
+#
+# Programs that use the pools must call shutdown_pool() (and, on each event loop,
+# shutdown_async_pool()) before exiting: python-chess keeps every engine on a
+# non-daemon thread, and the interpreter waits for those threads at exit.
+#
+# The Stockfish binary is looked up once per process and the result (path, version
+# and UCI options) cached in stockfish_cache.json until the binary changes.
+import asyncio
+import json
+import os
+import platform
+import shutil
+import threading
+import time
+import weakref
+
+DEFAULT_THREADS = 1
+DEFAULT_HASH_MB = 64
+# Discovery results, reused while the binary's modification time is unchanged
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stockfish_cache.json')
+PROBE_TIMEOUT = 5.0  # seconds a candidate binary gets to finish the UCI handshake
+# Options applied to every engine on top of Threads and Hash; options an engine
+# does not have (e.g. Contempt on newer Stockfish) are skipped
+ENGINE_OPTIONS = {
+    "Skill Level": 20,  # Maximum skill (0-20)
+    "UCI_LimitStrength": False,
+}
+
+
+def _candidate_paths():
+    # Common paths for Stockfish
+    if platform.system() == 'Windows':
+        stockfish_paths = [
+            'stockfish.exe',
+            './stockfish.exe',
+            os.path.join(os.getcwd(), 'stockfish.exe'),
+            'C:/stockfish/stockfish.exe',
+            os.path.expanduser('~/stockfish.exe')
+        ]
+    else:
+        stockfish_paths = [
+            'stockfish',
+            './stockfish',
+            '/usr/bin/stockfish',
+            '/usr/local/bin/stockfish',
+            '/opt/homebrew/bin/stockfish'  # macOS Apple Silicon
+        ]
+    on_path = shutil.which('stockfish')
+    if on_path:
+        stockfish_paths.append(on_path)
+    return [path for path in stockfish_paths if os.path.isfile(path)]
+
+
+def _probe(path):
+    """Run the UCI handshake with path; return its cache entry or None if it is no UCI engine"""
+    import chess.engine
+
+    try:
+        engine = chess.engine.SimpleEngine.popen_uci(path, timeout=PROBE_TIMEOUT)
+    except Exception:
+        return None
+    try:
+        return {
+            'path': os.path.abspath(path),
+            'mtime': os.stat(path).st_mtime,
+            'version': engine.id.get('name', ''),
+            'options': {name: {'type': option.type, 'default': option.default, 'min': option.min,
+                               'max': option.max, 'var': option.var}
+                        for name, option in engine.options.items()},
+        }
+    finally:
+        try:
+            engine.quit()
+        except Exception:
+            pass
+
+
+def _load_cache():
+    """The cached entry, if its binary still exists with the same modification time"""
+    try:
+        with open(CACHE_PATH) as cache_file:
+            info = json.load(cache_file)
+        return info if os.stat(info['path']).st_mtime == info['mtime'] else None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_cache(info):
+    try:
+        temporary = CACHE_PATH + '.tmp'
+        with open(temporary, 'w') as cache_file:
+            json.dump(info, cache_file, indent=1)
+        os.replace(temporary, CACHE_PATH)
+    except OSError:
+        pass  # read-only install: discover again next time
+
+
+def discover_stockfish(refresh=False):
+    """Return {'path', 'mtime', 'version', 'options'} for a working Stockfish, or None.
+
+    Discovery runs once per process. A warm start reads the on-disk cache and only
+    stats the binary; otherwise the candidate paths are probed with a UCI handshake
+    and, if none works, Stockfish is downloaded.
+    """
+    global _discovered
+    with _discovery_lock:
+        if _discovered is not None and not refresh:
+            return _discovered or None
+        info = None if refresh else _load_cache()
+        if info is None:
+            for path in _candidate_paths():
+                info = _probe(path)
+                if info:
+                    print(f"Found Stockfish at: {path}")
+                    break
+        if info is None:
+            print("Stockfish not found. Attempting to download...")
+            try:
+                from install_stockfish import install_stockfish
+                downloaded_path = install_stockfish()
+                info = _probe(downloaded_path) if downloaded_path and os.path.exists(downloaded_path) else None
+                if info is None:
+                    print("Could not download Stockfish. Falling back to minimax.")
+            except Exception as e:
+                print(f"Could not download Stockfish: {e}")
+                print("Please download Stockfish manually from: https://stockfishchess.org/download/")
+                print("Or install via package manager.")
+        if info is not None and info != _load_cache():
+            _save_cache(info)
+        _discovered = info or {}
+        return info
+
+
+def _configurable(engine, options):
+    """The options engine has and python-chess does not manage (e.g. MultiPV, Ponder)"""
+    return {name: value for name, value in options.items()
+            if name in engine.options and not engine.options[name].is_managed()}
+
+
+def find_stockfish():
+    """Return the path of a working Stockfish binary, or None"""
+    info = discover_stockfish()
+    return info['path'] if info else None
+
+
+def _default_size(size, threads):
+    return size or max(1, (os.cpu_count() or 1) // threads)
+
+
+class EngineBudget:
+    """Process-wide cap on running engines, shared by several pools.
+
+    A pool reserves a slot before it starts an engine and frees it once the engine
+    has quit. When every slot is taken, a waiting pool files a request and the other
+    pools retire an idle engine for it, each on its own thread or event loop, so
+    threaded and asyncio pools pass capacity back and forth.
+    Closed pools no longer count: close() has already quit their engines.
+    """
+
+    def __init__(self, size=None, threads=DEFAULT_THREADS):
+        self.size = _default_size(size, threads)
+        self._pools = weakref.WeakSet()
+        self._requests = {}  # request token -> pool waiting for a slot
+        self._lock = threading.Lock()
+
+    def register(self, pool):
+        with self._lock:
+            self._pools.add(pool)
+
+    def _running(self):
+        return sum(pool._count for pool in self._pools if not pool._closed)
+
+    def running(self):
+        """Engines running or being started across the open pools"""
+        with self._lock:
+            return self._running()
+
+    def reserve(self, pool):
+        """Count one more engine for pool if the budget has room"""
+        with self._lock:
+            if self._running() >= self.size:
+                return False
+            pool._count += 1
+            return True
+
+    def release(self, pool):
+        """pool's engine has quit: its slot is free for any pool"""
+        with self._lock:
+            pool._count -= 1
+        self._notify(None)
+
+    def forget(self, pool):
+        """pool has closed and no longer counts: its slots are free for the others"""
+        self._notify(pool)
+
+    def request(self, pool, token):
+        """pool waits for a slot: file token (once) and let the other pools offer an idle engine"""
+        with self._lock:
+            self._requests[token] = pool
+            others = [other for other in self._pools if other is not pool and not other._closed]
+        for other in others:
+            other._reclaim_requested()
+
+    def withdraw(self, token):
+        with self._lock:
+            self._requests.pop(token, None)
+
+    def take_request(self, pool):
+        """True when pool should retire an idle engine for another pool's request.
+
+        Each request is answered once, and only while the budget is still used up.
+        """
+        with self._lock:
+            if self._running() < self.size:
+                return False
+            token = next((token for token, waiting in self._requests.items() if waiting is not pool), None)
+            if token is None:
+                return False
+            del self._requests[token]
+            return True
+
+    def _notify(self, source):
+        with self._lock:
+            pools = [pool for pool in self._pools if pool is not source]
+        for pool in pools:
+            pool._slot_freed()
+
+
+class EnginePool:
+    def __init__(self, path, size=None, threads=DEFAULT_THREADS, hash_mb=DEFAULT_HASH_MB, options=None,
+                 budget=None):
+        """Pool of at most size engines (default: one per threads cores) running path.
+
+        threads and hash_mb are the Threads and Hash (MB) options of each engine.
+        With an EngineBudget the pool also stays within the budget shared with other pools.
+        """
+        self.path = path
+        self.threads = threads
+        self.hash_mb = hash_mb
+        self.size = _default_size(size, threads)
+        self.options = dict(ENGINE_OPTIONS if options is None else options)
+        self.budget = budget
+        self.started = 0
+        self.restarts = 0
+        self._idle = []
+        self._engines = set()  # every running engine, idle or checked out
+        self._count = 0  # engines running or being started
+        self._wakeups = 0  # bumped on every notify, so a wake-up before wait() is not lost
+        self._condition = threading.Condition()
+        self._closed = False
+        if budget is not None:
+            budget.register(self)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _start(self):
+        import chess.engine
+
+        engine = chess.engine.SimpleEngine.popen_uci(self.path)
+        options = dict(self.options, Threads=self.threads, Hash=self.hash_mb)
+        try:
+            engine.configure(_configurable(engine, options))
+        except Exception:
+            engine.quit()
+            raise
+        self.started += 1
+        with self._condition:
+            self._engines.add(engine)
+        return engine
+
+    @staticmethod
+    def _healthy(engine):
+        try:
+            engine.ping()
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, engine):
+        with self._condition:
+            self._engines.discard(engine)
+        try:
+            engine.quit()
+        except Exception:
+            try:
+                engine.close()
+            except Exception:
+                pass
+
+    def _reserve(self):
+        """Count one more engine if the pool and the budget have room; call with the lock held"""
+        if self._count >= self.size:
+            return False
+        if self.budget is None:
+            self._count += 1
+            return True
+        return self.budget.reserve(self)
+
+    def _free(self):
+        """Give back the slot of an engine that has quit; call without the lock"""
+        if self.budget is None:
+            with self._condition:
+                self._count -= 1
+                self._notify()
+        else:
+            self.budget.release(self)
+
+    def _notify(self):
+        self._wakeups += 1
+        self._condition.notify_all()
+
+    def _slot_freed(self):
+        with self._condition:
+            self._notify()
+
+    def _reclaim_requested(self):
+        """Another pool waits for a slot: retire an idle engine if the budget still needs one"""
+        with self._condition:
+            engine = self._idle.pop(0) if self._idle and self.budget.take_request(self) else None
+        if engine is not None:
+            threading.Thread(target=self._retire, args=(engine,), daemon=True).start()
+
+    def _retire(self, engine):
+        self._quit(engine)
+        self._free()
+
+    def acquire(self, timeout=None):
+        """Check out a running engine, starting one if the pool is not full yet.
+
+        Waits up to timeout seconds (forever when None) for an engine to come back and
+        raises TimeoutError after that. Pass the same game object to engine.analysis()
+        for every move of a game so the engine starts a new game only when it changes hands.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        token = object()
+        try:
+            while True:
+                with self._condition:
+                    if self._closed:
+                        raise RuntimeError("engine pool is closed")
+                    if self._idle:
+                        engine = self._idle.pop()
+                        break
+                    if self._reserve():
+                        engine = None
+                        break
+                    room = self._count < self.size
+                    wakeups = self._wakeups
+                # The budget is used up by other pools: ask them for an idle engine
+                if room and self.budget is not None:
+                    self.budget.request(self, token)
+                with self._condition:
+                    if self._wakeups != wakeups:
+                        continue
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if (remaining is not None and remaining <= 0) or not self._condition.wait(remaining):
+                        raise TimeoutError("no Stockfish engine became available")
+        finally:
+            if self.budget is not None:
+                self.budget.withdraw(token)
+        # Start or check the engine outside the lock so other games are not held up
+        try:
+            if engine is not None and not self._healthy(engine):
+                self.restarts += 1
+                self._quit(engine)
+                engine = None
+            if engine is None:
+                engine = self._start()
+        except Exception:
+            self._free()
+            raise
+        return engine
+
+    def release(self, engine, healthy=True):
+        """Return an engine; one that failed during use is shut down and replaced on demand.
+
+        A healthy engine is also shut down when another pool is waiting for its slot.
+        """
+        with self._condition:
+            keep = healthy and not self._closed
+            if keep and self.budget is not None and self.budget.take_request(self):
+                keep = False
+            if keep:
+                self._idle.append(engine)
+                self._notify()
+        if not keep:
+            self._quit(engine)
+            self._free()
+
+    def close(self):
+        """Quit every engine; engines still checked out fail their current command"""
+        with self._condition:
+            self._closed = True
+            engines = list(self._engines)
+            idle, self._idle = self._idle, []
+            self._notify()
+        for engine in engines:
+            self._quit(engine)
+        for _ in idle:
+            self._free()
+        if self.budget is not None:
+            self.budget.forget(self)
+
+
+class AsyncEnginePool:
+    def __init__(self, path, size=None, threads=DEFAULT_THREADS, hash_mb=DEFAULT_HASH_MB, options=None,
+                 budget=None):
+        """EnginePool for asyncio code: the same limits, with engines that are
+        python-chess UciProtocol objects bound to the event loop they were started on."""
+        self.path = path
+        self.threads = threads
+        self.hash_mb = hash_mb
+        self.size = _default_size(size, threads)
+        self.options = dict(ENGINE_OPTIONS if options is None else options)
+        self.budget = budget
+        self.started = 0
+        self.restarts = 0
+        self._idle = []
+        self._transports = {}  # every running engine, idle or checked out
+        self._count = 0  # engines running or being started
+        self._waiters = []  # futures of acquire() calls waiting for an engine
+        self._retiring = set()  # tasks quitting engines, awaited by close()
+        self._loop = None  # set by the first acquire()
+        self._closed = False
+        if budget is not None:
+            budget.register(self)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    async def _start(self):
+        import chess.engine
+
+        transport, engine = await chess.engine.popen_uci(self.path)
+        options = dict(self.options, Threads=self.threads, Hash=self.hash_mb)
+        try:
+            await engine.configure(_configurable(engine, options))
+        except BaseException:
+            transport.close()
+            raise
+        self.started += 1
+        self._transports[engine] = transport
+        return engine
+
+    @staticmethod
+    async def _healthy(engine):
+        try:
+            await engine.ping()
+            return True
+        except Exception:
+            return False
+
+    async def _quit(self, engine):
+        transport = self._transports.pop(engine, None)
+        try:
+            await engine.quit()
+        except Exception:
+            pass
+        finally:
+            if transport is not None:
+                transport.close()
+
+    def _reserve(self):
+        if self._count >= self.size:
+            return False
+        if self.budget is None:
+            self._count += 1
+            return True
+        return self.budget.reserve(self)
+
+    def _free(self):
+        if self.budget is None:
+            self._count -= 1
+            self._wake()
+        else:
+            self.budget.release(self)
+
+    def _wake(self):
+        while self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def _wake_all(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _call_soon(self, callback):
+        """Run callback on the pool's loop from any thread; False once the loop is gone"""
+        if self._loop is None:
+            return False
+        try:
+            self._loop.call_soon_threadsafe(callback)
+            return True
+        except RuntimeError:
+            return False
+
+    def _slot_freed(self):
+        # Every waiter retries: one whose request was answered may have lost the slot to another
+        self._call_soon(self._wake_all)
+
+    def _reclaim_requested(self):
+        # Called from any thread: the idle list is only touched on the pool's loop
+        self._call_soon(self._offer_idle)
+
+    def _offer_idle(self):
+        if self._idle and self.budget.take_request(self):
+            self._retire_soon(self._idle.pop(0))
+
+    def _retire_soon(self, engine):
+        task = asyncio.get_running_loop().create_task(self._retire(engine))
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    async def _retire(self, engine):
+        try:
+            await self._quit(engine)
+        finally:
+            self._free()  # also when asyncio.run() cancels the task as its loop ends
+
+    async def acquire(self, timeout=None):
+        """Check out a running engine, starting one if the pool is not full yet.
+
+        Waits up to timeout seconds (forever when None) and raises TimeoutError after
+        that. Cancelling the waiting task leaves the pool unchanged.
+        """
+        self._loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else self._loop.time() + timeout
+        token = object()
+        try:
+            while True:
+                if self._closed:
+                    raise RuntimeError("engine pool is closed")
+                if self._idle:
+                    engine = self._idle.pop()
+                    break
+                if self._reserve():
+                    engine = None
+                    break
+                # The budget is used up by other pools: ask them for an idle engine
+                if self._count < self.size and self.budget is not None:
+                    self.budget.request(self, token)
+                waiter = self._loop.create_future()
+                self._waiters.append(waiter)
+                try:
+                    await asyncio.wait_for(waiter, None if deadline is None else deadline - self._loop.time())
+                except asyncio.TimeoutError:
+                    raise TimeoutError("no Stockfish engine became available") from None
+                finally:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+        finally:
+            if self.budget is not None:
+                self.budget.withdraw(token)
+        try:
+            if engine is not None and not await self._healthy(engine):
+                self.restarts += 1
+                await self._quit(engine)
+                engine = None
+            if engine is None:
+                engine = await self._start()
+        except BaseException:
+            self._free()
+            raise
+        return engine
+
+    def release(self, engine, healthy=True):
+        """Return an engine; not a coroutine, so a cancelled task can still call it.
+
+        A search still running on the engine is stopped by its next command; a healthy
+        engine is shut down instead when another pool is waiting for its slot.
+        """
+        keep = healthy and not self._closed
+        if keep and self.budget is not None and self.budget.take_request(self):
+            keep = False
+        if keep:
+            self._idle.append(engine)
+            self._wake()
+        else:
+            self._retire_soon(engine)
+
+    async def close(self):
+        """Quit every engine; engines still checked out fail their current command"""
+        self._closed = True
+        idle, self._idle = self._idle, []
+        self._wake_all()
+        await asyncio.gather(*(self._quit(engine) for engine in list(self._transports)), *self._retiring)
+        for _ in idle:
+            self._free()
+        if self.budget is not None:
+            self.budget.forget(self)
+
+
+_discovered = None  # discover_stockfish() result, {} when nothing was found
+_discovery_lock = threading.Lock()
+
+# The process-wide pool, created on first use with pool_settings
+pool_settings = {'size': None, 'threads': DEFAULT_THREADS, 'hash_mb': DEFAULT_HASH_MB}
+_pool = None
+_pool_lock = threading.Lock()
+# Caps the engines of the shared pool and every event loop's pool together
+_budget = EngineBudget(pool_settings['size'], pool_settings['threads'])
+_async_pools = weakref.WeakKeyDictionary()  # event loop -> its AsyncEnginePool
+
+
+def configure_pool(size=None, threads=DEFAULT_THREADS, hash_mb=DEFAULT_HASH_MB):
+    """Set the shared pools' engine budget and per-engine settings; an existing pool is replaced"""
+    global _pool
+    with _pool_lock:
+        pool_settings.update(size=size, threads=threads, hash_mb=hash_mb)
+        _budget.size = _default_size(size, threads)
+        old, _pool = _pool, None
+    if old is not None:
+        old.close()
+
+
+def get_pool(path):
+    """Return the shared pool, creating it for the Stockfish binary at path"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != path:
+            old, _pool = _pool, EnginePool(path, budget=_budget, **pool_settings)
+            if old is not None:
+                old.close()
+        return _pool
+
+
+def async_pool(path):
+    """Return the running event loop's pool for the Stockfish binary at path.
+
+    Like get_pool() it is replaced when the path or the pool_settings have changed.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _async_pools.get(loop)
+    threads = pool_settings['threads']
+    settings = (path, _default_size(pool_settings['size'], threads), threads, pool_settings['hash_mb'])
+    if pool is None or pool._closed or (pool.path, pool.size, pool.threads, pool.hash_mb) != settings:
+        if pool is not None and not pool._closed:
+            loop.create_task(pool.close())
+        pool = _async_pools[loop] = AsyncEnginePool(path, budget=_budget, **pool_settings)
+    return pool
+
+
+async def shutdown_async_pool():
+    """Quit the engines of the running event loop's pool; call before the loop closes"""
+    pool = _async_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+def shared_pool():
+    """Return the shared pool for the discovered Stockfish, or None when there is none"""
+    path = find_stockfish()
+    return get_pool(path) if path else None
+
+
+def warm_up():
+    """Discover Stockfish and start one pooled engine on a background thread.
+
+    Call it while a menu is shown; the first StockfishAI move then finds an engine
+    already running. Returns the thread.
+    """
+    thread = threading.Thread(target=_warm_up, name='stockfish-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def _warm_up():
+    try:
+        pool = shared_pool()
+        if pool is not None:
+            pool.release(pool.acquire())
+    except Exception as e:
+        print(f"Could not start Stockfish: {e}")
+
+
+def shutdown_pool():
+    """Quit every engine of the shared pool; call it before the program exits"""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, None
+    if old is not None:
+        old.close()
@@ -0,0 +1,144 @@
+# Static evaluation tables (framework-agnostic)
+# Material values and piece-square tables, plus the same tables flattened into one
+# 64-entry array per color and piece. GameState keeps the white-positive sum of
+# PSQT entries for every piece on the board as psqt_score, updated on every move.
+from bitboard import PIECE_TYPES, COLORS
+
+# Improved piece values (standard chess values)
+PIECE_VALUES = {
+    'pawn': 100,
+    'knight': 320,
+    'bishop': 330,
+    'rook': 500,
+    'queen': 900,
+    'king': 20000
+}
+
+# Piece-square tables for positional evaluation
+PAWN_TABLE = [
+    [0,  0,  0,  0,  0,  0,  0,  0],
+    [50, 50, 50, 50, 50, 50, 50, 50],
+    [10, 10, 20, 30, 30, 20, 10, 10],
+    [5,  5, 10, 25, 25, 10,  5,  5],
+    [0,  0,  0, 20, 20,  0,  0,  0],
+    [5, -5,-10,  0,  0,-10, -5,  5],
+    [5, 10, 10,-20,-20, 10, 10,  5],
+    [0,  0,  0,  0,  0,  0,  0,  0]
+]
+
+KNIGHT_TABLE = [
+    [-50,-40,-30,-30,-30,-30,-40,-50],
+    [-40,-20,  0,  0,  0,  0,-20,-40],
+    [-30,  0, 10, 15, 15, 10,  0,-30],
+    [-30,  5, 15, 20, 20, 15,  5,-30],
+    [-30,  0, 15, 20, 20, 15,  0,-30],
+    [-30,  5, 10, 15, 15, 10,  5,-30],
+    [-40,-20,  0,  5,  5,  0,-20,-40],
+    [-50,-40,-30,-30,-30,-30,-40,-50]
+]
+
+BISHOP_TABLE = [
+    [-20,-10,-10,-10,-10,-10,-10,-20],
+    [-10,  0,  0,  0,  0,  0,  0,-10],
+    [-10,  0,  5, 10, 10,  5,  0,-10],
+    [-10,  5,  5, 10, 10,  5,  5,-10],
+    [-10,  0, 10, 10, 10, 10,  0,-10],
+    [-10, 10, 10, 10, 10, 10, 10,-10],
+    [-10,  5,  0,  0,  0,  0,  5,-10],
+    [-20,-10,-10,-10,-10,-10,-10,-20]
+]
+
+ROOK_TABLE = [
+    [0,  0,  0,  0,  0,  0,  0,  0],
+    [5, 10, 10, 10, 10, 10, 10,  5],
+    [-5,  0,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0,  0, -5],
+    [0,  0,  0,  5,  5,  0,  0,  0]
+]
+
+QUEEN_TABLE = [
+    [-20,-10,-10, -5, -5,-10,-10,-20],
+    [-10,  0,  0,  0,  0,  0,  0,-10],
+    [-10,  0,  5,  5,  5,  5,  0,-10],
+    [-5,  0,  5,  5,  5,  5,  0, -5],
+    [0,  0,  5,  5,  5,  5,  0, -5],
+    [-10,  5,  5,  5,  5,  5,  0,-10],
+    [-10,  0,  5,  0,  0,  0,  0,-10],
+    [-20,-10,-10, -5, -5,-10,-10,-20]
+]
+
+KING_TABLE = [
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-20,-30,-30,-40,-40,-30,-30,-20],
+    [-10,-20,-20,-20,-20,-20,-20,-10],
+    [20, 20,  0,  0,  0,  0, 20, 20],
+    [20, 30, 10,  0,  0, 10, 30, 20]
+]
+
+
+TABLES = {'pawn': PAWN_TABLE, 'knight': KNIGHT_TABLE, 'bishop': BISHOP_TABLE,
+          'rook': ROOK_TABLE, 'queen': QUEEN_TABLE, 'king': KING_TABLE}
+
+
+def _flatten(piece, color):
+    """Material plus table value per square, negated for black; black reads the table flipped"""
+    table = TABLES[piece]
+    values = []
+    for square in range(64):
+        col, row = square & 7, square >> 3
+        value = PIECE_VALUES[piece] + table[row if color == 'white' else 7 - row][col]
+        values.append(value if color == 'white' else -value)
+    return values
+
+
+# PSQT[color][piece][square], white-positive
+PSQT = {color: {piece: _flatten(piece, color) for piece in PIECE_TYPES} for color in COLORS}
+
+
+def psqt_score(state):
+    """Full material and piece-square sum; GameState only needs this after loading a position"""
+    score = 0
+    for color, pieces, locations in (('white', state.white_pieces, state.white_locations),
+                                     ('black', state.black_pieces, state.black_locations)):
+        table = PSQT[color]
+        for piece, location in zip(pieces, locations):
+            score += table[piece][location[1] * 8 + location[0]]
+    return score
+
+
+class PawnHashTable:
+    """Fixed-size cache of pawn structure scores keyed by GameState.pawn_key"""
+
+    def __init__(self, entries=1 << 14):
+        size = 1 << max(0, entries - 1).bit_length()
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.scores = [0] * size
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key):
+        """Return the cached score for key, or None"""
+        self.probes += 1
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index]
+        return None
+
+    def store(self, key, score):
+        index = key & self.mask
+        self.keys[index] = key
+        self.scores[index] = score
+
+    def reset_stats(self):
+        self.probes = self.hits = 0
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
@@ -1,17 +1,38 @@
 # Core chess game logic (framework-agnostic)
-from constants import *
+import movegen
+import zobrist
+from evaluation import PSQT, psqt_score
+from bitboard import Bitboards, POS_BITS, square_name, parse_square_name
 
-# These will be set by additions.py to avoid circular imports
-check_options = None
-check_ep = None
+FEN_PIECES = {'p': 'pawn', 'n': 'knight', 'b': 'bishop', 'r': 'rook', 'q': 'queen', 'k': 'king'}
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
 
-def set_move_functions(options_func, ep_func):
-    """Set the move checking functions from additions.py"""
-    global check_options, check_ep
+# Move generation defaults to the pygame-free movegen module
+check_options = movegen.check_options
+check_ep = movegen.check_ep
+check_castling = movegen.check_castling
+
+def set_move_functions(options_func, ep_func, castling_func=movegen.check_castling):
+    """Override the move generators.
+    
+    options_func(state, color) returns one option list per piece of color,
+    ep_func(state, from_pos, to_pos) returns the en passant square a move creates and
+    castling_func(state, color) returns the (king_target, rook_target) castle moves.
+    """
+    global check_options, check_ep, check_castling
     check_options = options_func
     check_ep = ep_func
+    check_castling = castling_func
 
 class GameState:
+    # The parallel piece/location/moved lists stay the authoritative position: the GUI,
+    # the option lists and the undo stack all address pieces by list index. self.board
+    # holds the same position as bitboards for O(1) occupancy tests and is updated
+    # alongside the lists on every move path.
+    
+    # Cross-check every incremental option update (and the bitboards) against a full regeneration
+    debug_incremental = False
+    
     def __init__(self):
         self.reset_game()
     
@@ -29,6 +50,7 @@ class GameState:
         self.captured_pieces_white = []
         self.captured_pieces_black = []
         self.turn_step = 0
+        self.ply = 0  # half-moves played, drives opening book depth and FEN move numbers
         self.selection = 100
         self.valid_moves = []
         self.white_ep = (100, 100)
@@ -43,18 +65,73 @@ class GameState:
         self.white_options = []
         self.black_options = []
         self.selected_piece = None
+        self._undo_stack = []
+        self._rebuild_board()
         self._update_options()
     
-    def _update_options(self):
-        if check_options:
-            # Store current state temporarily for move checking functions
-            # The check_options function uses global variables from additions.py
-            # We need to update those before calling check_options
-            self.white_options = check_options(self.white_pieces, self.white_locations, 'white')
-            self.black_options = check_options(self.black_pieces, self.black_locations, 'black')
+    def _rebuild_board(self):
+        """Rebuild the occupancy masks and the position key from the piece/location lists"""
+        self.board = Bitboards.from_lists(self.white_pieces, self.white_locations,
+                                          self.black_pieces, self.black_locations)
+        self.castling_rights = zobrist.castling_rights(self)
+        self.zobrist_key = zobrist.compute_key(self)
+        self.pawn_key = zobrist.compute_pawn_key(self)
+        self.psqt_score = psqt_score(self)
+    
+    def _hash_turn(self, from_pos, to_pos, old_ep, new_ep):
+        """Update the key for the side to move, en passant and castling changes of a move"""
+        rights = self.castling_rights & zobrist.CASTLING_MASKS[from_pos[1] * 8 + from_pos[0]] \
+            & zobrist.CASTLING_MASKS[to_pos[1] * 8 + to_pos[0]]
+        self.zobrist_key ^= zobrist.SIDE_KEY ^ zobrist.ep_key(old_ep) ^ zobrist.ep_key(new_ep) \
+            ^ zobrist.CASTLING_KEYS[self.castling_rights] ^ zobrist.CASTLING_KEYS[rights]
+        self.castling_rights = rights
+    
+    def _update_options(self, changed=0, touched_white=(), touched_black=()):
+        """Regenerate move options.
+        
+        Called with no arguments every option list is rebuilt. The move paths pass a mask
+        of the squares they changed plus the indexes of the pieces they moved or promoted,
+        and only options that depend on those squares are regenerated.
+        """
+        if check_options is movegen.check_options and (changed or touched_white or touched_black) \
+                and len(self.white_options) == len(self.white_pieces) \
+                and len(self.black_options) == len(self.black_pieces):
+            self.white_options = movegen.update_options(self, 'white', self.white_options, changed, touched_white)
+            self.black_options = movegen.update_options(self, 'black', self.black_options, changed, touched_black)
+            if self.debug_incremental:
+                self._verify_board()
+                self._verify_options()
+            self.castling_moves = check_castling(self, 'white' if self.turn_step < 2 else 'black')
+        elif check_options:
+            self.white_options = check_options(self, 'white')
+            self.black_options = check_options(self, 'black')
+            # Castling is only offered to the side to move
+            self.castling_moves = check_castling(self, 'white' if self.turn_step < 2 else 'black')
         else:
             self.white_options = []
             self.black_options = []
+            self.castling_moves = []
+    
+    def _verify_board(self):
+        """Raise if the bitboards no longer describe the piece/location lists"""
+        expected = Bitboards.from_lists(self.white_pieces, self.white_locations,
+                                        self.black_pieces, self.black_locations)
+        if self.board.pieces != expected.pieces or self.board.occupied != expected.occupied:
+            raise AssertionError('bitboards out of sync with the piece lists')
+    
+    def _verify_options(self):
+        """Raise if the incrementally updated options differ from a full regeneration"""
+        for color, options in (('white', self.white_options), ('black', self.black_options)):
+            expected = check_options(self, color)
+            if options != expected:
+                raise AssertionError(f'incremental {color} options out of sync: {options} != {expected}')
+    
+    def _drop_options(self, color, index):
+        """Remove a captured piece's option list without mutating the shared list"""
+        if color == 'white':
+            self.white_options = self.white_options[:index] + self.white_options[index + 1:]
+        else:
+            self.black_options = self.black_options[:index] + self.black_options[index + 1:]
     
     def get_board_state(self):
         """Return serializable board state for online play"""
@@ -66,10 +143,12 @@ class GameState:
             'capturedPiecesWhite': self.captured_pieces_white.copy(),
             'capturedPiecesBlack': self.captured_pieces_black.copy(),
             'turnStep': self.turn_step,
+            'ply': self.ply,
             'whiteEp': list(self.white_ep) if self.white_ep != (100, 100) else [100, 100],
             'blackEp': list(self.black_ep) if self.black_ep != (100, 100) else [100, 100],
             'winner': self.winner,
-            'gameOver': self.game_over
+            'gameOver': self.game_over,
+            'positionKey': format(self.zobrist_key, '016x')
         }
     
     def load_board_state(self, state):
@@ -83,6 +162,7 @@ class GameState:
             self.captured_pieces_white = state.get('capturedPiecesWhite', [])
             self.captured_pieces_black = state.get('capturedPiecesBlack', [])
             self.turn_step = state.get('turnStep', 0)
+            self.ply = state.get('ply', self.ply)
             self.white_ep = tuple(state.get('whiteEp', [100, 100]))
             self.black_ep = tuple(state.get('blackEp', [100, 100]))
             self.winner = state.get('winner', '')
@@ -100,8 +180,103 @@ class GameState:
             self.black_ep = tuple(state.get('black_ep', state.get('blackEp', [100, 100]))) if isinstance(state.get('black_ep', state.get('blackEp', [100, 100])), list) else state.get('black_ep', state.get('blackEp', (100, 100)))
             self.winner = state.get('winner', '')
             self.game_over = state.get('game_over', state.get('gameOver', False))
+        # Moved flags are not serialized, keep them only while they still line up with the pieces
+        if len(self.white_moved) != len(self.white_pieces):
+            self.white_moved = [False] * len(self.white_pieces)
+        if len(self.black_moved) != len(self.black_pieces):
+            self.black_moved = [False] * len(self.black_pieces)
+        self._undo_stack = []
+        self._rebuild_board()
+        self._update_options()
+    
+    def load_fen(self, fen):
+        """Load a position from Forsyth-Edwards Notation"""
+        fields = fen.split()
+        self.reset_game()
+        self.white_pieces, self.white_locations = [], []
+        self.black_pieces, self.black_locations = [], []
+        for rank_index, rank in enumerate(fields[0].split('/')):
+            row = 7 - rank_index
+            file_index = 0
+            for char in rank:
+                if char.isdigit():
+                    file_index += int(char)
+                    continue
+                # FEN lists files a-h, the board's columns run h-a
+                location = (7 - file_index, row)
+                if char.isupper():
+                    self.white_pieces.append(FEN_PIECES[char.lower()])
+                    self.white_locations.append(location)
+                else:
+                    self.black_pieces.append(FEN_PIECES[char])
+                    self.black_locations.append(location)
+                file_index += 1
+        self.turn_step = 0 if len(fields) < 2 or fields[1] == 'w' else 2
+        fullmove = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+        self.ply = 2 * (max(fullmove, 1) - 1) + (1 if self.turn_step >= 2 else 0)
+        
+        # Castling rights become moved flags on the kings and corner rooks
+        rights = fields[2] if len(fields) > 2 else '-'
+        self.white_moved = self._moved_from_rights(self.white_pieces, self.white_locations, 0, rights.count('K'), rights.count('Q'))
+        self.black_moved = self._moved_from_rights(self.black_pieces, self.black_locations, 7, rights.count('k'), rights.count('q'))
+        
+        ep = fields[3] if len(fields) > 3 else '-'
+        if ep != '-':
+            # The en passant square belongs to the side that just moved
+            if self.turn_step < 2:
+                self.black_ep = parse_square_name(ep)
+            else:
+                self.white_ep = parse_square_name(ep)
+        self._rebuild_board()
         self._update_options()
     
+    def _moved_from_rights(self, pieces, locations, row, kingside, queenside):
+        moved = []
+        for piece, location in zip(pieces, locations):
+            if piece == 'king':
+                moved.append(location != (3, row) or not (kingside or queenside))
+            elif piece == 'rook' and location == (0, row):
+                moved.append(not kingside)
+            elif piece == 'rook' and location == (7, row):
+                moved.append(not queenside)
+            else:
+                moved.append(False)
+        return moved
+    
+    def get_fen(self):
+        """Return the position in Forsyth-Edwards Notation"""
+        letters = {piece: letter for letter, piece in FEN_PIECES.items()}
+        placement = {}
+        for piece, location in zip(self.white_pieces, self.white_locations):
+            placement[location] = letters[piece].upper()
+        for piece, location in zip(self.black_pieces, self.black_locations):
+            placement[location] = letters[piece]
+        ranks = []
+        for row in range(7, -1, -1):
+            rank, empty = '', 0
+            for col in range(7, -1, -1):
+                if (col, row) in placement:
+                    rank += (str(empty) if empty else '') + placement[(col, row)]
+                    empty = 0
+                else:
+                    empty += 1
+            ranks.append(rank + (str(empty) if empty else ''))
+        
+        rights = ''
+        for moved, pieces, locations, row, symbols in ((self.white_moved, self.white_pieces, self.white_locations, 0, 'KQ'),
+                                                        (self.black_moved, self.black_pieces, self.black_locations, 7, 'kq')):
+            if (3, row) not in locations or pieces[locations.index((3, row))] != 'king' or moved[locations.index((3, row))]:
+                continue
+            for rook_pos, symbol in (((0, row), symbols[0]), ((7, row), symbols[1])):
+                if rook_pos in locations and pieces[locations.index(rook_pos)] == 'rook' \
+                        and not moved[locations.index(rook_pos)]:
+                    rights += symbol
+        
+        ep = self.black_ep if self.turn_step < 2 else self.white_ep
+        ep = square_name(ep) if ep != (100, 100) else '-'
+        side = 'w' if self.turn_step < 2 else 'b'
+        return f"{'/'.join(ranks)} {side} {rights or '-'} {ep} 0 {self.ply // 2 + 1}"
+    
     def make_move(self, from_pos, to_pos, promotion_piece=None):
         """Make a move and return True if successful"""
         if self.game_over:
@@ -109,7 +284,7 @@ class GameState:
         
         # Determine which player is moving
         if self.turn_step < 2:
-            if from_pos not in self.white_locations:
+            if not self.board.occupied['white'] & POS_BITS.get(from_pos, 0):
                 return False
             piece_index = self.white_locations.index(from_pos)
             piece = self.white_pieces[piece_index]
@@ -128,7 +303,7 @@ class GameState:
             self._execute_white_move(piece_index, to_pos)
             return True
         else:
-            if from_pos not in self.black_locations:
+            if not self.board.occupied['black'] & POS_BITS.get(from_pos, 0):
                 return False
             piece_index = self.black_locations.index(from_pos)
             piece = self.black_pieces[piece_index]
@@ -149,65 +324,113 @@ class GameState:
     
     def _execute_white_move(self, piece_index, to_pos):
         from_pos = self.white_locations[piece_index]
+        changed = POS_BITS[from_pos] | POS_BITS[to_pos] | POS_BITS.get(self.white_ep, 0)
         if check_ep:
-            self.white_ep = check_ep(from_pos, to_pos)
+            self.white_ep = check_ep(self, from_pos, to_pos)
         else:
             self.white_ep = (100, 100)
+        changed |= POS_BITS.get(self.white_ep, 0)
+        self._hash_turn(from_pos, to_pos, self.black_ep, self.white_ep)
         self.white_locations[piece_index] = to_pos
         self.white_moved[piece_index] = True
         
         # Check for captures
-        if to_pos in self.black_locations:
+        if self.board.occupied['black'] & POS_BITS[to_pos]:
             black_piece = self.black_locations.index(to_pos)
             self.captured_pieces_white.append(self.black_pieces[black_piece])
             if self.black_pieces[black_piece] == 'king':
                 self.winner = 'white'
+            self.board.remove('black', self.black_pieces[black_piece], to_pos)
+            self.zobrist_key ^= zobrist.PIECE_KEYS['black'][self.black_pieces[black_piece]][to_pos[1] * 8 + to_pos[0]]
+            self.psqt_score -= PSQT['black'][self.black_pieces[black_piece]][to_pos[1] * 8 + to_pos[0]]
+            if self.black_pieces[black_piece] == 'pawn':
+                self.pawn_key ^= zobrist.PIECE_KEYS['black']['pawn'][to_pos[1] * 8 + to_pos[0]]
             self.black_pieces.pop(black_piece)
             self.black_locations.pop(black_piece)
             self.black_moved.pop(black_piece)
+            self._drop_options('black', black_piece)
+        self.board.move('white', self.white_pieces[piece_index], from_pos, to_pos)
+        piece_keys = zobrist.PIECE_KEYS['white'][self.white_pieces[piece_index]]
+        self.zobrist_key ^= piece_keys[from_pos[1] * 8 + from_pos[0]] ^ piece_keys[to_pos[1] * 8 + to_pos[0]]
+        piece_values = PSQT['white'][self.white_pieces[piece_index]]
+        self.psqt_score += piece_values[to_pos[1] * 8 + to_pos[0]] - piece_values[from_pos[1] * 8 + from_pos[0]]
+        if self.white_pieces[piece_index] == 'pawn':
+            self.pawn_key ^= piece_keys[from_pos[1] * 8 + from_pos[0]] ^ piece_keys[to_pos[1] * 8 + to_pos[0]]
         
         # Check en passant
-        if to_pos == self.black_ep:
-            black_piece = self.black_locations.index((self.black_ep[0], self.black_ep[1] - 1))
+        if to_pos == self.black_ep and self.white_pieces[piece_index] == 'pawn':
+            ep_pawn = (self.black_ep[0], self.black_ep[1] - 1)
+            black_piece = self.black_locations.index(ep_pawn)
             self.captured_pieces_white.append(self.black_pieces[black_piece])
+            self.board.remove('black', self.black_pieces[black_piece], ep_pawn)
+            self.zobrist_key ^= zobrist.PIECE_KEYS['black']['pawn'][ep_pawn[1] * 8 + ep_pawn[0]]
+            self.psqt_score -= PSQT['black']['pawn'][ep_pawn[1] * 8 + ep_pawn[0]]
+            self.pawn_key ^= zobrist.PIECE_KEYS['black']['pawn'][ep_pawn[1] * 8 + ep_pawn[0]]
             self.black_pieces.pop(black_piece)
             self.black_locations.pop(black_piece)
             self.black_moved.pop(black_piece)
+            self._drop_options('black', black_piece)
+            changed |= POS_BITS[ep_pawn]
         
-        self._update_options()
         self.turn_step = 2
+        self.ply += 1
+        self._update_options(changed, touched_white=(piece_index,))
         self.selection = 100
         self.valid_moves = []
     
     def _execute_black_move(self, piece_index, to_pos):
         from_pos = self.black_locations[piece_index]
+        changed = POS_BITS[from_pos] | POS_BITS[to_pos] | POS_BITS.get(self.black_ep, 0)
         if check_ep:
-            self.black_ep = check_ep(from_pos, to_pos)
+            self.black_ep = check_ep(self, from_pos, to_pos)
         else:
             self.black_ep = (100, 100)
+        changed |= POS_BITS.get(self.black_ep, 0)
+        self._hash_turn(from_pos, to_pos, self.white_ep, self.black_ep)
         self.black_locations[piece_index] = to_pos
         self.black_moved[piece_index] = True
         
         # Check for captures
-        if to_pos in self.white_locations:
+        if self.board.occupied['white'] & POS_BITS[to_pos]:
             white_piece = self.white_locations.index(to_pos)
             self.captured_pieces_black.append(self.white_pieces[white_piece])
             if self.white_pieces[white_piece] == 'king':
                 self.winner = 'black'
+            self.board.remove('white', self.white_pieces[white_piece], to_pos)
+            self.zobrist_key ^= zobrist.PIECE_KEYS['white'][self.white_pieces[white_piece]][to_pos[1] * 8 + to_pos[0]]
+            self.psqt_score -= PSQT['white'][self.white_pieces[white_piece]][to_pos[1] * 8 + to_pos[0]]
+            if self.white_pieces[white_piece] == 'pawn':
+                self.pawn_key ^= zobrist.PIECE_KEYS['white']['pawn'][to_pos[1] * 8 + to_pos[0]]
             self.white_pieces.pop(white_piece)
             self.white_locations.pop(white_piece)
             self.white_moved.pop(white_piece)
+            self._drop_options('white', white_piece)
+        self.board.move('black', self.black_pieces[piece_index], from_pos, to_pos)
+        piece_keys = zobrist.PIECE_KEYS['black'][self.black_pieces[piece_index]]
+        self.zobrist_key ^= piece_keys[from_pos[1] * 8 + from_pos[0]] ^ piece_keys[to_pos[1] * 8 + to_pos[0]]
+        piece_values = PSQT['black'][self.black_pieces[piece_index]]
+        self.psqt_score += piece_values[to_pos[1] * 8 + to_pos[0]] - piece_values[from_pos[1] * 8 + from_pos[0]]
+        if self.black_pieces[piece_index] == 'pawn':
+            self.pawn_key ^= piece_keys[from_pos[1] * 8 + from_pos[0]] ^ piece_keys[to_pos[1] * 8 + to_pos[0]]
         
         # Check en passant
-        if to_pos == self.white_ep:
-            white_piece = self.white_locations.index((self.white_ep[0], self.white_ep[1] + 1))
+        if to_pos == self.white_ep and self.black_pieces[piece_index] == 'pawn':
+            ep_pawn = (self.white_ep[0], self.white_ep[1] + 1)
+            white_piece = self.white_locations.index(ep_pawn)
             self.captured_pieces_black.append(self.white_pieces[white_piece])
+            self.board.remove('white', self.white_pieces[white_piece], ep_pawn)
+            self.zobrist_key ^= zobrist.PIECE_KEYS['white']['pawn'][ep_pawn[1] * 8 + ep_pawn[0]]
+            self.psqt_score -= PSQT['white']['pawn'][ep_pawn[1] * 8 + ep_pawn[0]]
+            self.pawn_key ^= zobrist.PIECE_KEYS['white']['pawn'][ep_pawn[1] * 8 + ep_pawn[0]]
             self.white_pieces.pop(white_piece)
             self.white_locations.pop(white_piece)
             self.white_moved.pop(white_piece)
+            self._drop_options('white', white_piece)
+            changed |= POS_BITS[ep_pawn]
         
-        self._update_options()
         self.turn_step = 0
+        self.ply += 1
+        self._update_options(changed, touched_black=(piece_index,))
         self.selection = 100
         self.valid_moves = []
     
@@ -218,34 +441,179 @@ class GameState:
                 return False
             self.white_locations[piece_index] = castle_move[0]
             self.white_moved[piece_index] = True
+            self.board.move('white', 'king', (3, 0), castle_move[0])
+            changed = POS_BITS.get(self.white_ep, 0)
+            self._hash_turn((3, 0), castle_move[0], self.black_ep, (100, 100))
+            self.white_ep = (100, 100)
             if castle_move[0] == (1, 0):
                 rook_coords = (0, 0)
             else:
                 rook_coords = (7, 0)
             rook_index = self.white_locations.index(rook_coords)
             self.white_locations[rook_index] = castle_move[1]
+            self.board.move('white', 'rook', rook_coords, castle_move[1])
+            touched_white, touched_black = (piece_index, rook_index), ()
+            changed |= POS_BITS[(3, 0)] | POS_BITS[rook_coords]
+            color, row = 'white', 0
         else:
             piece_index = self.black_locations.index((3, 7)) if (3, 7) in self.black_locations else None
             if piece_index is None:
                 return False
             self.black_locations[piece_index] = castle_move[0]
             self.black_moved[piece_index] = True
+            self.board.move('black', 'king', (3, 7), castle_move[0])
+            changed = POS_BITS.get(self.black_ep, 0)
+            self._hash_turn((3, 7), castle_move[0], self.white_ep, (100, 100))
+            self.black_ep = (100, 100)
             if castle_move[0] == (1, 7):
                 rook_coords = (0, 7)
             else:
                 rook_coords = (7, 7)
             rook_index = self.black_locations.index(rook_coords)
             self.black_locations[rook_index] = castle_move[1]
+            self.board.move('black', 'rook', rook_coords, castle_move[1])
+            touched_white, touched_black = (), (piece_index, rook_index)
+            changed |= POS_BITS[(3, 7)] | POS_BITS[rook_coords]
+            color, row = 'black', 7
+        changed |= POS_BITS[castle_move[0]] | POS_BITS[castle_move[1]]
+        king_keys = zobrist.PIECE_KEYS[color]['king']
+        rook_keys = zobrist.PIECE_KEYS[color]['rook']
+        self.zobrist_key ^= king_keys[row * 8 + 3] ^ king_keys[castle_move[0][1] * 8 + castle_move[0][0]] \
+            ^ rook_keys[rook_coords[1] * 8 + rook_coords[0]] ^ rook_keys[castle_move[1][1] * 8 + castle_move[1][0]]
+        king_values, rook_values = PSQT[color]['king'], PSQT[color]['rook']
+        self.psqt_score += king_values[castle_move[0][1] * 8 + castle_move[0][0]] - king_values[row * 8 + 3] \
+            + rook_values[castle_move[1][1] * 8 + castle_move[1][0]] - rook_values[rook_coords[1] * 8 + rook_coords[0]]
         
-        self._update_options()
         if is_white:
             self.turn_step = 2
         else:
             self.turn_step = 0
+        self.ply += 1
+        self._update_options(changed, touched_white, touched_black)
         self.selection = 100
         self.valid_moves = []
         return True
     
+    def push(self, move):
+        """Make a move in place for search; pop() restores the exact previous position.
+        
+        move is (from_pos, to_pos) or (from_pos, to_pos, promotion_piece). A king moving two
+        columns castles and a pawn reaching the last row promotes (to a queen by default).
+        """
+        from_pos, to_pos = move[0], move[1]
+        white = self.turn_step < 2
+        if white:
+            pieces, locations, moved = self.white_pieces, self.white_locations, self.white_moved
+            enemy_pieces, enemy_locations, enemy_moved = self.black_pieces, self.black_locations, self.black_moved
+            enemy_ep, last_row = self.black_ep, 7
+        else:
+            pieces, locations, moved = self.black_pieces, self.black_locations, self.black_moved
+            enemy_pieces, enemy_locations, enemy_moved = self.white_pieces, self.white_locations, self.white_moved
+            enemy_ep, last_row = self.white_ep, 0
+        piece_index = locations.index(from_pos)
+        piece = pieces[piece_index]
+        captured = rook = promoted = None
+        undo = (self.turn_step, self.white_ep, self.black_ep, self.winner,
+                self.white_options, self.black_options, self.castling_moves,
+                self.zobrist_key, self.castling_rights, self.pawn_key, self.psqt_score, piece_index, from_pos, moved[piece_index])
+        
+        if piece == 'king' and abs(to_pos[0] - from_pos[0]) == 2:
+            rook_from = (0, from_pos[1]) if to_pos[0] < from_pos[0] else (7, from_pos[1])
+            rook_to = ((from_pos[0] + to_pos[0]) // 2, from_pos[1])
+            rook = (locations.index(rook_from), rook_from)
+            self._execute_castle(white, (to_pos, rook_to))
+        else:
+            if self.board.occupied['black' if white else 'white'] & POS_BITS[to_pos]:
+                captured_location = to_pos
+            elif piece == 'pawn' and to_pos == enemy_ep:
+                captured_location = (to_pos[0], from_pos[1])
+            else:
+                captured_location = None
+            if captured_location is not None:
+                index = enemy_locations.index(captured_location)
+                captured = (index, enemy_pieces[index], captured_location, enemy_moved[index])
+            if white:
+                self._execute_white_move(piece_index, to_pos)
+            else:
+                self._execute_black_move(piece_index, to_pos)
+            if piece == 'pawn' and to_pos[1] == last_row:
+                promoted = move[2] if len(move) > 2 else 'queen'
+                self._replace_piece('white' if white else 'black', piece_index, promoted)
+        self._undo_stack.append(undo + (captured, rook, promoted))
+    
+    def pop(self):
+        """Undo the last push()"""
+        (turn_step, white_ep, black_ep, winner, white_options, black_options, castling_moves,
+         zobrist_key, castling_rights, pawn_key, psqt_score, piece_index, from_pos, was_moved,
+         captured, rook, promoted) = self._undo_stack.pop()
+        if turn_step < 2:
+            color, enemy = 'white', 'black'
+            pieces, locations, moved = self.white_pieces, self.white_locations, self.white_moved
+            enemy_pieces, enemy_locations, enemy_moved = self.black_pieces, self.black_locations, self.black_moved
+            captured_list = self.captured_pieces_white
+        else:
+            color, enemy = 'black', 'white'
+            pieces, locations, moved = self.black_pieces, self.black_locations, self.black_moved
+            enemy_pieces, enemy_locations, enemy_moved = self.white_pieces, self.white_locations, self.white_moved
+            captured_list = self.captured_pieces_black
+        
+        to_pos = locations[piece_index]
+        if promoted:
+            self.board.replace(color, promoted, 'pawn', to_pos)
+            pieces[piece_index] = 'pawn'
+        self.board.move(color, pieces[piece_index], to_pos, from_pos)
+        locations[piece_index] = from_pos
+        moved[piece_index] = was_moved
+        if rook:
+            rook_index, rook_from = rook
+            self.board.move(color, 'rook', locations[rook_index], rook_from)
+            locations[rook_index] = rook_from
+        if captured:
+            index, piece, location, piece_moved = captured
+            enemy_pieces.insert(index, piece)
+            enemy_locations.insert(index, location)
+            enemy_moved.insert(index, piece_moved)
+            self.board.add(enemy, piece, location)
+            captured_list.pop()
+        
+        self.turn_step = turn_step
+        self.ply -= 1
+        self.white_ep = white_ep
+        self.black_ep = black_ep
+        self.winner = winner
+        self.white_options = white_options
+        self.black_options = black_options
+        self.castling_moves = castling_moves
+        self.zobrist_key = zobrist_key
+        self.castling_rights = castling_rights
+        self.pawn_key = pawn_key
+        self.psqt_score = psqt_score
+    
+    def push_null(self):
+        """Pass the turn for null-move pruning; pop_null() undoes it"""
+        white = self.turn_step < 2
+        self._undo_stack.append((self.turn_step, self.white_ep, self.black_ep, self.white_options,
+                                 self.black_options, self.castling_moves, self.zobrist_key))
+        # The passing side made no double pawn push, so the opponent has no en passant capture
+        old_ep, enemy_ep = (self.white_ep, self.black_ep) if white else (self.black_ep, self.white_ep)
+        self.zobrist_key ^= zobrist.SIDE_KEY ^ zobrist.ep_key(enemy_ep)
+        if white:
+            self.white_ep = (100, 100)
+        else:
+            self.black_ep = (100, 100)
+        self.turn_step = 2 if white else 0
+        self.ply += 1
+        if old_ep in POS_BITS:
+            self._update_options(POS_BITS[old_ep])
+        else:
+            self.castling_moves = check_castling(self, 'black' if white else 'white')
+    
+    def pop_null(self):
+        """Undo the last push_null()"""
+        (self.turn_step, self.white_ep, self.black_ep, self.white_options, self.black_options,
+         self.castling_moves, self.zobrist_key) = self._undo_stack.pop()
+        self.ply -= 1
+    
     def check_promotion(self):
         self.white_promote = False
         self.black_promote = False
@@ -265,12 +633,27 @@ class GameState:
     
     def promote_pawn(self, piece_type):
         if self.white_promote and self.promo_index < len(self.white_pieces):
-            self.white_pieces[self.promo_index] = piece_type
+            self._replace_piece('white', self.promo_index, piece_type)
             self.white_promote = False
         elif self.black_promote and self.promo_index < len(self.black_pieces):
-            self.black_pieces[self.promo_index] = piece_type
+            self._replace_piece('black', self.promo_index, piece_type)
             self.black_promote = False
-        self._update_options()
+        else:
+            self._update_options()
+    
+    def _replace_piece(self, color, index, piece_type):
+        """Change the type of a piece in place (pawn promotion)"""
+        pieces = self.white_pieces if color == 'white' else self.black_pieces
+        location = (self.white_locations if color == 'white' else self.black_locations)[index]
+        square = location[1] * 8 + location[0]
+        self.board.replace(color, pieces[index], piece_type, location)
+        self.zobrist_key ^= zobrist.PIECE_KEYS[color][pieces[index]][square] ^ zobrist.PIECE_KEYS[color][piece_type][square]
+        self.psqt_score += PSQT[color][piece_type][square] - PSQT[color][pieces[index]][square]
+        if pieces[index] == 'pawn':
+            self.pawn_key ^= zobrist.PIECE_KEYS[color]['pawn'][square]
+        pieces[index] = piece_type
+        if color == 'white':
+            self._update_options(touched_white=(index,))
+        else:
+            self._update_options(touched_black=(index,))
 
-# Note: check_options and check_ep functions are defined in additions.py
-# They will be imported when needed
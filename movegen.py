@@ -0,0 +1,365 @@
+# Move generation (framework-agnostic)
+# Every function takes the position explicitly, so this module can be used from
+# the server, the AI search and worker processes without importing pygame.
+from bitboard import (PIECE_TYPES, POS_BITS, square_name, parse_square_name, KNIGHT_TARGETS, KING_TARGETS, KNIGHT_ATTACKS, KING_ATTACKS,
+                      BISHOP_RAYS, ROOK_RAYS, QUEEN_RAYS, BISHOP_LINES, ROOK_LINES, PAWN_ATTACKERS)
+
+PROMOTION_PIECES = ('queen', 'rook', 'bishop', 'knight')
+PROMOTION_LETTERS = {'queen': 'q', 'rook': 'r', 'bishop': 'b', 'knight': 'n'}
+
+
+def enemy_of(color):
+    return 'black' if color == 'white' else 'white'
+
+
+# function to check all pieces valid options on board
+def check_options(state, color):
+    """Return the option list of every piece of color, in piece-list order"""
+    if color == 'white':
+        pieces, locations = state.white_pieces, state.white_locations
+    else:
+        pieces, locations = state.black_pieces, state.black_locations
+    return [check_piece(state, piece, location, color) for piece, location in zip(pieces, locations)]
+
+
+def _pawn_dependencies(step, start_row):
+    """Per-square mask of the squares a pawn's options are read from"""
+    table = []
+    for square in range(64):
+        col, row = square & 7, square >> 3
+        mask = 0
+        for target in ((col, row + step), (col + 1, row + step), (col - 1, row + step)):
+            mask |= POS_BITS.get(target, 0)
+        if row == start_row:
+            mask |= POS_BITS.get((col, row + 2 * step), 0)
+        table.append(mask)
+    return table
+
+
+# Squares whose occupancy can change each piece's option list, indexed by square.
+# Slider lines and pawn diagonals also cover empty squares, so a changed en passant
+# square is picked up the same way as a changed piece.
+OPTION_DEPENDENCIES = {
+    color: {
+        'pawn': pawns,
+        'knight': KNIGHT_ATTACKS,
+        'bishop': BISHOP_LINES,
+        'rook': ROOK_LINES,
+        'queen': [bishop | rook for bishop, rook in zip(BISHOP_LINES, ROOK_LINES)],
+        'king': KING_ATTACKS,
+    }
+    for color, pawns in (('white', _pawn_dependencies(1, 1)), ('black', _pawn_dependencies(-1, 6)))
+}
+
+
+def update_options(state, color, previous, changed, touched=()):
+    """Return a copy of previous with only the affected option lists regenerated.
+
+    changed is a mask of squares whose contents changed since previous was built and
+    touched holds the piece indexes that moved or changed type. previous must already
+    line up with the current piece list (captured pieces removed).
+    """
+    if color == 'white':
+        pieces, locations = state.white_pieces, state.white_locations
+    else:
+        pieces, locations = state.black_pieces, state.black_locations
+    dependencies = OPTION_DEPENDENCIES[color]
+    options = list(previous)
+    for i, piece in enumerate(pieces):
+        location = locations[i]
+        if i in touched or changed & dependencies[piece][location[1] * 8 + location[0]]:
+            options[i] = check_piece(state, piece, location, color)
+    return options
+
+
+def check_piece(state, piece, position, color):
+    """Return the pseudo-legal target squares for one piece"""
+    if piece == 'pawn':
+        return check_pawn(state, position, color)
+    elif piece == 'rook':
+        return check_rook(state, position, color)
+    elif piece == 'knight':
+        return check_knight(state, position, color)
+    elif piece == 'bishop':
+        return check_bishop(state, position, color)
+    elif piece == 'queen':
+        return check_queen(state, position, color)
+    elif piece == 'king':
+        return check_king(state, position, color)
+    return []
+
+
+# check king valid moves (castling is generated separately by check_castling)
+def check_king(state, position, color):
+    friends = state.board.occupied[color]
+    return [target for target, bit in KING_TARGETS[position[1] * 8 + position[0]] if not friends & bit]
+
+
+# check queen valid moves
+def check_queen(state, position, color):
+    return _slide(state, QUEEN_RAYS[position[1] * 8 + position[0]], color)
+
+
+# check bishop moves
+def check_bishop(state, position, color):
+    return _slide(state, BISHOP_RAYS[position[1] * 8 + position[0]], color)
+
+
+# check rook moves
+def check_rook(state, position, color):
+    return _slide(state, ROOK_RAYS[position[1] * 8 + position[0]], color)
+
+
+def _slide(state, rays, color):
+    """Walk precomputed rays up to the first blocker, including it if it is an enemy"""
+    moves_list = []
+    friends = state.board.occupied[color]
+    occupied = friends | state.board.occupied[enemy_of(color)]
+    for ray in rays:
+        for target, bit in ray:
+            if occupied & bit:
+                if not friends & bit:
+                    moves_list.append(target)
+                break
+            moves_list.append(target)
+    return moves_list
+
+
+# check valid pawn moves
+def check_pawn(state, position, color):
+    moves_list = []
+    occupied = state.board.all_occupied
+    if color == 'white':
+        # white moves down the screen (increasing row), starting on row 1
+        step, start_row, last_row = 1, 1, 7
+        enemies = state.board.occupied['black']
+        ep = state.black_ep
+    else:
+        step, start_row, last_row = -1, 6, 0
+        enemies = state.board.occupied['white']
+        ep = state.white_ep
+    if position[1] == last_row:
+        return moves_list
+    forward_one = (position[0], position[1] + step)
+    if not occupied & POS_BITS[forward_one]:
+        moves_list.append(forward_one)
+        if position[1] == start_row:
+            forward_two = (position[0], position[1] + 2 * step)
+            if not occupied & POS_BITS[forward_two]:
+                moves_list.append(forward_two)
+    # diagonal captures, including en passant onto the square the enemy pawn skipped
+    for x in (1, -1):
+        target = (position[0] + x, position[1] + step)
+        bit = POS_BITS.get(target, 0)
+        if bit and (enemies & bit or target == ep):
+            moves_list.append(target)
+    return moves_list
+
+
+# check valid knight moves
+def check_knight(state, position, color):
+    friends = state.board.occupied[color]
+    return [target for target, bit in KNIGHT_TARGETS[position[1] * 8 + position[0]] if not friends & bit]
+
+
+def is_square_attacked(state, position, by_color):
+    """Return True if any piece of by_color attacks position"""
+    masks = state.board.pieces[by_color]
+    square = position[1] * 8 + position[0]
+    if PAWN_ATTACKERS[by_color][square] & masks['pawn'] or KNIGHT_ATTACKS[square] & masks['knight'] \
+            or KING_ATTACKS[square] & masks['king']:
+        return True
+    occupied = state.board.all_occupied
+    queens = masks['queen']
+    for lines, rays, sliders in ((ROOK_LINES, ROOK_RAYS, masks['rook'] | queens),
+                                 (BISHOP_LINES, BISHOP_RAYS, masks['bishop'] | queens)):
+        if not lines[square] & sliders:
+            continue
+        for ray in rays[square]:
+            for _, bit in ray:
+                if occupied & bit:
+                    if sliders & bit:
+                        return True
+                    break
+    return False
+
+
+def attackers_to(state, square, occupied):
+    """Mask of the pieces of both colors in occupied that attack square.
+    
+    Sliders are traced through occupied only, so removing pieces from it reveals
+    the x-ray attackers behind them.
+    """
+    white, black = state.board.pieces['white'], state.board.pieces['black']
+    attackers = PAWN_ATTACKERS['white'][square] & white['pawn'] | PAWN_ATTACKERS['black'][square] & black['pawn'] \
+        | KNIGHT_ATTACKS[square] & (white['knight'] | black['knight']) \
+        | KING_ATTACKS[square] & (white['king'] | black['king'])
+    queens = white['queen'] | black['queen']
+    for rays, sliders in ((ROOK_RAYS, white['rook'] | black['rook'] | queens),
+                          (BISHOP_RAYS, white['bishop'] | black['bishop'] | queens)):
+        for ray in rays[square]:
+            for _, bit in ray:
+                if occupied & bit:
+                    attackers |= sliders & bit
+                    break
+    return attackers & occupied
+
+
+def static_exchange(state, move, values):
+    """Material the side to move wins by the capture sequence that move starts on its target square.
+    
+    Both sides recapture with their least valuable attacker and may stop whenever
+    continuing would lose material. values maps piece types to material values.
+    """
+    from_pos, to_pos = move[0], move[1]
+    board = state.board
+    color = 'white' if state.turn_step < 2 else 'black'
+    square = to_pos[1] * 8 + to_pos[0]
+    victim = board.piece_on(enemy_of(color), POS_BITS[to_pos])
+    if victim is None:
+        victim = 'pawn'  # en passant
+    attacker = board.piece_on(color, POS_BITS[from_pos])
+    occupied = board.all_occupied & ~POS_BITS[from_pos]
+    gains = [values[victim]]
+    side = enemy_of(color)
+    while True:
+        attackers = attackers_to(state, square, occupied) & board.occupied[side]
+        if not attackers:
+            break
+        masks = board.pieces[side]
+        for piece in PIECE_TYPES:
+            bit = masks[piece] & attackers
+            if bit:
+                bit &= -bit
+                break
+        # the piece standing on the square is captured next
+        gains.append(values[attacker] - gains[-1])
+        occupied &= ~bit
+        attacker = piece
+        side = enemy_of(side)
+    while len(gains) > 1:
+        gain = gains.pop()
+        gains[-1] = -max(-gains[-1], gain)
+    return gains[0]
+
+
+def king_position(state, color):
+    pieces = state.white_pieces if color == 'white' else state.black_pieces
+    if 'king' not in pieces:
+        return None
+    locations = state.white_locations if color == 'white' else state.black_locations
+    return locations[pieces.index('king')]
+
+
+def in_check(state, color):
+    king_pos = king_position(state, color)
+    return king_pos is not None and is_square_attacked(state, king_pos, enemy_of(color))
+
+
+# check en passant because people on the internet won't stop bugging me for it
+def check_ep(state, old_coords, new_coords):
+    """Return the en passant square created by moving old_coords to new_coords"""
+    if state.turn_step <= 1:
+        index = state.white_locations.index(old_coords)
+        ep_coords = (new_coords[0], new_coords[1] - 1)
+        piece = state.white_pieces[index]
+    else:
+        index = state.black_locations.index(old_coords)
+        ep_coords = (new_coords[0], new_coords[1] + 1)
+        piece = state.black_pieces[index]
+    if piece == 'pawn' and abs(old_coords[1] - new_coords[1]) > 1:
+        return ep_coords
+    return (100, 100)
+
+
+# add castling
+def check_castling(state, color):
+    # king must not currently be in check, neither the rook nor king has moved previously, nothing between
+    # and the king does not pass through or finish on an attacked square
+    castle_moves = []  # store each valid castle move as ((king_coords), (castle_coords))
+    if color == 'white':
+        locations, moved, row = state.white_locations, state.white_moved, 0
+    else:
+        locations, moved, row = state.black_locations, state.black_moved, 7
+    king_pos = (3, row)
+    if not state.board.pieces[color]['king'] & POS_BITS[king_pos]:
+        return castle_moves
+    if moved[locations.index(king_pos)]:
+        return castle_moves
+    enemy = enemy_of(color)
+    if is_square_attacked(state, king_pos, enemy):
+        return castle_moves
+    occupied = state.board.all_occupied
+    for rook_col in (0, 7):
+        rook_pos = (rook_col, row)
+        if not state.board.pieces[color]['rook'] & POS_BITS[rook_pos]:
+            continue
+        if moved[locations.index(rook_pos)]:
+            continue
+        if rook_col > king_pos[0]:
+            empty_squares = [(4, row), (5, row), (6, row)]
+        else:
+            empty_squares = [(2, row), (1, row)]
+        if any(occupied & POS_BITS[square] for square in empty_squares):
+            continue
+        # the king crosses empty_squares[0] and lands on empty_squares[1]
+        if is_square_attacked(state, empty_squares[0], enemy) or is_square_attacked(state, empty_squares[1], enemy):
+            continue
+        castle_moves.append((empty_squares[1], empty_squares[0]))
+    return castle_moves
+
+
+def pseudo_legal_moves(state):
+    """All moves for the side to move as (from_pos, to_pos[, promotion]) tuples.
+    
+    Promotions are expanded to one move per promotion piece and castling moves
+    are included. Moves may leave the mover's own king attacked.
+    """
+    if state.turn_step < 2:
+        pieces, locations, options = state.white_pieces, state.white_locations, state.white_options
+        promotion_row, home = 6, (3, 0)
+    else:
+        pieces, locations, options = state.black_pieces, state.black_locations, state.black_options
+        promotion_row, home = 1, (3, 7)
+    moves = []
+    for i, targets in enumerate(options):
+        location = locations[i]
+        if pieces[i] == 'pawn' and location[1] == promotion_row:
+            for target in targets:
+                for promotion in PROMOTION_PIECES:
+                    moves.append((location, target, promotion))
+        else:
+            for target in targets:
+                moves.append((location, target))
+    for king_target, _ in state.castling_moves:
+        moves.append((home, king_target))
+    return moves
+
+
+def legal_moves(state):
+    """Pseudo-legal moves that do not leave the mover's king attacked"""
+    color = 'white' if state.turn_step < 2 else 'black'
+    moves = []
+    for move in pseudo_legal_moves(state):
+        state.push(move)
+        if not in_check(state, color):
+            moves.append(move)
+        state.pop()
+    return moves
+
+
+def move_to_uci(move):
+    """Format a (from_pos, to_pos[, promotion]) move in UCI notation, e.g. 'e7e8q'"""
+    uci = square_name(move[0]) + square_name(move[1])
+    if len(move) > 2:
+        uci += PROMOTION_LETTERS[move[2]]
+    return uci
+
+
+def move_from_uci(uci):
+    """Parse a UCI move string into a (from_pos, to_pos[, promotion]) move"""
+    from_pos, to_pos = parse_square_name(uci[0:2]), parse_square_name(uci[2:4])
+    if len(uci) > 4:
+        promotion = next(piece for piece, letter in PROMOTION_LETTERS.items() if letter == uci[4])
+        return (from_pos, to_pos, promotion)
+    return (from_pos, to_pos)
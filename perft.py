@@ -0,0 +1,163 @@
+# Perft: move generation correctness and speed benchmark
+# Counts the leaf nodes of the legal move tree from a position and compares them with
+# published node counts. Run `python perft.py` for the standard suite or
+# `python perft.py --fen "<fen>" --depth 3 --divide` to debug a single position.
+import argparse
+import sys
+import time
+
+import movegen
+from game_logic import GameState, START_FEN
+
+# Standard positions with known node counts, see https://www.chessprogramming.org/Perft_Results
+SUITE = [
+    ('start', START_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('promotions', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('talkchess', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+]
+
+
+def perft(state, depth):
+    """Count the leaf nodes of the legal move tree depth plies below state"""
+    if depth == 0:
+        return 1
+    moves = movegen.legal_moves(state)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        state.push(move)
+        nodes += perft(state, depth - 1)
+        state.pop()
+    return nodes
+
+
+def divide(state, depth):
+    """Return {uci_move: node_count} for every legal root move"""
+    counts = {}
+    for move in movegen.legal_moves(state):
+        state.push(move)
+        counts[movegen.move_to_uci(move)] = perft(state, depth - 1)
+        state.pop()
+    return counts
+
+
+def python_chess_divide(fen, depth):
+    """Reference divide computed by python-chess"""
+    import chess
+
+    board = chess.Board(fen)
+    counts = {}
+    for move in board.legal_moves:
+        board.push(move)
+        counts[move.uci()] = _python_chess_perft(board, depth - 1)
+        board.pop()
+    return counts
+
+
+def _python_chess_perft(board, depth):
+    if depth == 0:
+        return 1
+    if depth == 1:
+        return board.legal_moves.count()
+    nodes = 0
+    for move in board.legal_moves:
+        board.push(move)
+        nodes += _python_chess_perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def compare_with_python_chess(fen, depth):
+    """Return a list of (uci_move, ours, reference) for every root move that disagrees"""
+    state = GameState()
+    state.load_fen(fen)
+    ours = divide(state, depth)
+    reference = python_chess_divide(fen, depth)
+    return [(move, ours.get(move), reference.get(move))
+            for move in sorted(set(ours) | set(reference)) if ours.get(move) != reference.get(move)]
+
+
+def run_suite(max_nodes=100000, validate=False):
+    """Run every suite position up to the deepest known count within max_nodes.
+
+    Returns True when every count matches (and python-chess agrees, if validate is set).
+    """
+    ok = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, counts in SUITE:
+        state = GameState()
+        state.load_fen(fen)
+        for depth, expected in enumerate(counts, start=1):
+            if expected > max_nodes:
+                break
+            start = time.perf_counter()
+            nodes = perft(state, depth)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            status = 'ok' if nodes == expected else f'MISMATCH (expected {expected})'
+            print(f'{name:<12} depth {depth}: {nodes:>9} nodes {elapsed:8.2f}s '
+                  f'{nodes / max(elapsed, 1e-9):>9.0f} nps  {status}')
+            if nodes != expected:
+                ok = False
+                if validate:
+                    for move, mine, reference in compare_with_python_chess(fen, depth):
+                        print(f'    {move}: {mine} (python-chess {reference})')
+                break
+        if validate and ok:
+            depth = min(2, len(counts))
+            mismatches = compare_with_python_chess(fen, depth)
+            if mismatches:
+                ok = False
+                print(f'{name:<12} python-chess divide mismatch at depth {depth}: {mismatches}')
+    print(f'total: {total_nodes} nodes in {total_time:.2f}s, {total_nodes / max(total_time, 1e-9):.0f} nps')
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Perft move generation benchmark')
+    parser.add_argument('--fen', help='position to search (default: run the standard suite)')
+    parser.add_argument('--depth', type=int, default=3, help='search depth for --fen')
+    parser.add_argument('--divide', action='store_true', help='print the node count below every root move')
+    parser.add_argument('--max-nodes', type=int, default=100000,
+                        help='skip suite depths whose known count exceeds this')
+    parser.add_argument('--validate', action='store_true', help='cross-check move counts against python-chess')
+    parser.add_argument('--debug-incremental', action='store_true',
+                        help='cross-check every incremental option update against a full regeneration')
+    args = parser.parse_args(argv)
+    GameState.debug_incremental = args.debug_incremental
+
+    if not args.fen:
+        return 0 if run_suite(args.max_nodes, args.validate) else 1
+
+    state = GameState()
+    state.load_fen(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(state, args.depth)
+        for move in sorted(counts):
+            print(f'{move}: {counts[move]}')
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(state, args.depth)
+    elapsed = time.perf_counter() - start
+    print(f'nodes: {nodes}  time: {elapsed:.2f}s  nps: {nodes / max(elapsed, 1e-9):.0f}')
+    if args.validate:
+        mismatches = compare_with_python_chess(args.fen, args.depth)
+        for move, mine, reference in mismatches:
+            print(f'mismatch {move}: {mine} (python-chess {reference})')
+        return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# Time management for engine searches (framework-agnostic)
+# Each game has a clock of base seconds plus an increment per move. A move gets a
+# soft limit (its share of the remaining clock) and a hard limit (a few times
+# that, never more than a fraction of the clock). The engine is told the hard
+# limit; after every completed iteration the search stops once the soft limit has
+# passed. While the best move stays the same from depth to depth, the soft limit
+# shrinks, so easy moves are played quickly and unclear ones get more time.
+import time
+
+DEFAULT_BASE = 60.0  # seconds per game
+DEFAULT_INCREMENT = 0.5  # seconds added after every move
+MOVES_TO_GO = 40  # the remaining clock is spread over this many moves
+INCREMENT_SHARE = 0.75  # part of the increment spent on the move that earns it
+HARD_FACTOR = 4  # hard limit = soft limit * this ...
+MAX_CLOCK_SHARE = 0.3  # ... but at most this share of the remaining clock
+MOVE_OVERHEAD = 0.05  # seconds kept back per move for communication
+MIN_LIMIT = 0.01
+# Soft limit scale by the number of iterations the best move has survived unchanged
+STABILITY_SCALES = (1.0, 0.85, 0.65, 0.5, 0.4, 0.3)
+
+
+class TimeManager:
+    def __init__(self, base=DEFAULT_BASE, increment=DEFAULT_INCREMENT, moves_to_go=MOVES_TO_GO):
+        """Clock of base seconds plus increment per move for one side of a game"""
+        self.base = base
+        self.increment = increment
+        self.moves_to_go = moves_to_go
+        self.new_game()
+
+    def new_game(self):
+        self.remaining = self.base
+        self.moves = 0
+        self.time_used = 0.0
+        self.soft_limit = self.hard_limit = None
+        self._start = None
+
+    def average_move_time(self):
+        return self.time_used / self.moves if self.moves else 0.0
+
+    def start_move(self):
+        """Start the clock for a move; return its (soft, hard) limits in seconds"""
+        available = max(0.0, self.remaining - MOVE_OVERHEAD)
+        soft = available / self.moves_to_go + self.increment * INCREMENT_SHARE
+        hard = min(soft * HARD_FACTOR, available * MAX_CLOCK_SHARE + self.increment * INCREMENT_SHARE)
+        self.hard_limit = max(MIN_LIMIT, hard)
+        self.soft_limit = max(MIN_LIMIT, min(soft, self.hard_limit))
+        self._start = time.perf_counter()
+        self._best_move = None
+        self._depth = 0
+        self._stable = 0
+        return self.soft_limit, self.hard_limit
+
+    def elapsed(self):
+        return time.perf_counter() - self._start if self._start is not None else 0.0
+
+    def update(self, info):
+        """Feed one python-chess info dict of the running search; True once it should stop.
+
+        An info line with a pv at a new depth marks a completed iteration, the only
+        point where the soft limit is checked.
+        """
+        depth, variation = info.get('depth'), info.get('pv')
+        if not depth or not variation or depth <= self._depth:
+            return False
+        self._depth = depth
+        if variation[0] == self._best_move:
+            self._stable += 1
+        else:
+            self._best_move, self._stable = variation[0], 0
+        scale = STABILITY_SCALES[min(self._stable, len(STABILITY_SCALES) - 1)]
+        return self.elapsed() >= self.soft_limit * scale
+
+    def finish_move(self):
+        """Charge the move's time to the clock, add the increment and return the time used"""
+        elapsed = self.elapsed()
+        self.remaining = max(0.0, self.remaining - elapsed) + self.increment
+        self.moves += 1
+        self.time_used += elapsed
+        self._start = None
+        return elapsed
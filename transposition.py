@@ -0,0 +1,95 @@
+# Transposition table for the minimax search (framework-agnostic)
+# Entries live in one flat buffer so the table has a fixed memory footprint.
+# Each bucket holds two entries: a depth-preferred slot that only yields to deeper
+# (or stale) results, and an always-replace slot for everything else.
+# The buffer may be shared between search processes without locking: every entry
+# stores key ^ data next to data, so an entry torn by concurrent writers no longer
+# matches its key and is simply treated as a miss.
+import struct
+
+EXACT, LOWER, UPPER = 1, 2, 3
+
+# key ^ data, data; data packs score (32 bits), move (16), depth (8), flag | generation << 2 (8)
+_ENTRY = struct.Struct('<QQ')
+ENTRY_SIZE = _ENTRY.size
+BUCKET_SIZE = 2 * ENTRY_SIZE
+SCORE_LIMIT = 2 ** 31 - 1
+
+PROMOTION_CODES = {None: 0, 'queen': 1, 'rook': 2, 'bishop': 3, 'knight': 4}
+PROMOTION_PIECES = {code: piece for piece, code in PROMOTION_CODES.items()}
+
+
+def encode_move(move):
+    """Pack a (from_pos, to_pos[, promotion]) move into 15 bits; 0 means no move"""
+    from_pos, to_pos = move[0], move[1]
+    promotion = move[2] if len(move) > 2 else None
+    return (from_pos[1] * 8 + from_pos[0]) | (to_pos[1] * 8 + to_pos[0]) << 6 | PROMOTION_CODES[promotion] << 12
+
+
+def decode_move(code):
+    if not code:
+        return None
+    from_square, to_square, promotion = code & 63, code >> 6 & 63, code >> 12
+    move = ((from_square & 7, from_square >> 3), (to_square & 7, to_square >> 3))
+    if promotion:
+        return move + (PROMOTION_PIECES[promotion],)
+    return move
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16, buffer=None):
+        """Create a table of size_mb megabytes, or wrap an existing writable buffer"""
+        if buffer is None:
+            buffer = bytearray(max(1, int(size_mb * 1024 * 1024)) // BUCKET_SIZE * BUCKET_SIZE)
+        buckets = len(buffer) // BUCKET_SIZE
+        # Round down to a power of two so the bucket index is a mask of the key
+        self.bucket_count = 1 << (buckets.bit_length() - 1)
+        self.buffer = buffer
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        """Age the table so entries from earlier moves are replaced first"""
+        self.generation = (self.generation + 1) & 63
+        self.probes = self.hits = self.stores = 0
+
+    def clear(self):
+        self.buffer[:] = bytes(len(self.buffer))
+
+    def probe(self, key):
+        """Return (score, move, depth, flag) stored for key, or None"""
+        self.probes += 1
+        offset = (key & (self.bucket_count - 1)) * BUCKET_SIZE
+        for slot in (offset, offset + ENTRY_SIZE):
+            check, data = _ENTRY.unpack_from(self.buffer, slot)
+            if check ^ data == key and data >> 56 & 3:
+                self.hits += 1
+                score = data & 0xFFFFFFFF
+                if score & 0x80000000:
+                    score -= 1 << 32
+                return score, decode_move(data >> 32 & 0xFFFF), data >> 48 & 0xFF, data >> 56 & 3
+        return None
+
+    def store(self, key, depth, score, flag, move=None):
+        if score != score or abs(score) > SCORE_LIMIT:
+            return  # infinite scores come from nodes without moves, nothing to remember
+        self.stores += 1
+        offset = (key & (self.bucket_count - 1)) * BUCKET_SIZE
+        check, data = _ENTRY.unpack_from(self.buffer, offset)
+        stored_key = check ^ data
+        if stored_key == key or depth >= data >> 48 & 0xFF or data >> 58 != self.generation:
+            slot = offset
+        else:
+            slot = offset + ENTRY_SIZE
+            check, data = _ENTRY.unpack_from(self.buffer, slot)
+            stored_key = check ^ data
+        code = encode_move(move) if move else 0
+        if not code and stored_key == key:
+            code = data >> 32 & 0xFFFF  # keep the old best move when this result has none
+        data = int(score) & 0xFFFFFFFF | code << 32 | min(depth, 255) << 48 | (flag | self.generation << 2) << 56
+        _ENTRY.pack_into(self.buffer, slot, key ^ data, data)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
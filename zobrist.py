@@ -0,0 +1,93 @@
+# Zobrist position keys (framework-agnostic)
+# A position key is the XOR of one random 64-bit number per (color, piece, square),
+# plus numbers for the side to move, the castling rights and the en passant column.
+# GameState keeps its key up to date by XOR-ing the differences of every move,
+# and keeps a second key over the pawns only (pawn_key) the same way.
+import random
+
+from bitboard import PIECE_TYPES, COLORS, POS_BITS, square_of
+
+_rng = random.Random(0x5EED_C0DE)
+
+
+def _key():
+    return _rng.getrandbits(64)
+
+
+PIECE_KEYS = {color: {piece: [_key() for _ in range(64)] for piece in PIECE_TYPES} for color in COLORS}
+SIDE_KEY = _key()  # XOR-ed in while black is to move
+EP_KEYS = [_key() for _ in range(8)]  # indexed by the en passant column
+
+# Castling rights bits: the king and that rook have not moved yet.
+# The board is mirrored, so the kingside rook starts on col 0 and the queenside rook on col 7.
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+_castling_bit_keys = [_key() for _ in range(4)]
+CASTLING_KEYS = [0] * 16
+for _rights in range(16):
+    for _bit in range(4):
+        if _rights & (1 << _bit):
+            CASTLING_KEYS[_rights] ^= _castling_bit_keys[_bit]
+
+# Rights that survive a move touching each square; a move keeps
+# castling_rights & CASTLING_MASKS[from] & CASTLING_MASKS[to]
+CASTLING_MASKS = [ALL_CASTLING] * 64
+CASTLING_MASKS[square_of((3, 0))] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[square_of((0, 0))] &= ~WHITE_KINGSIDE
+CASTLING_MASKS[square_of((7, 0))] &= ~WHITE_QUEENSIDE
+CASTLING_MASKS[square_of((3, 7))] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[square_of((0, 7))] &= ~BLACK_KINGSIDE
+CASTLING_MASKS[square_of((7, 7))] &= ~BLACK_QUEENSIDE
+
+
+def ep_key(ep):
+    """Key for an en passant square, 0 when there is none"""
+    return EP_KEYS[ep[0]] if ep in POS_BITS else 0
+
+
+def castling_rights(state):
+    """Derive the castling rights bits from the moved flags"""
+    rights = 0
+    for pieces, locations, moved, row, kingside, queenside in (
+            (state.white_pieces, state.white_locations, state.white_moved, 0, WHITE_KINGSIDE, WHITE_QUEENSIDE),
+            (state.black_pieces, state.black_locations, state.black_moved, 7, BLACK_KINGSIDE, BLACK_QUEENSIDE)):
+        if not _unmoved(pieces, locations, moved, 'king', (3, row)):
+            continue
+        if _unmoved(pieces, locations, moved, 'rook', (0, row)):
+            rights |= kingside
+        if _unmoved(pieces, locations, moved, 'rook', (7, row)):
+            rights |= queenside
+    return rights
+
+
+def _unmoved(pieces, locations, moved, piece, location):
+    if location not in locations:
+        return False
+    index = locations.index(location)
+    return pieces[index] == piece and not moved[index]
+
+
+def compute_key(state):
+    """Full key computation; GameState only needs this after loading a position"""
+    key = 0
+    for color, pieces, locations in (('white', state.white_pieces, state.white_locations),
+                                     ('black', state.black_pieces, state.black_locations)):
+        for piece, location in zip(pieces, locations):
+            key ^= PIECE_KEYS[color][piece][square_of(location)]
+    if state.turn_step >= 2:
+        key ^= SIDE_KEY
+        key ^= ep_key(state.white_ep)
+    else:
+        key ^= ep_key(state.black_ep)
+    return key ^ CASTLING_KEYS[state.castling_rights]
+
+
+def compute_pawn_key(state):
+    """Key of the pawns alone, used to cache pawn structure evaluation"""
+    key = 0
+    for color, pieces, locations in (('white', state.white_pieces, state.white_locations),
+                                     ('black', state.black_pieces, state.black_locations)):
+        for piece, location in zip(pieces, locations):
+            if piece == 'pawn':
+                key ^= PIECE_KEYS[color]['pawn'][square_of(location)]
+    return key